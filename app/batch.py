@@ -0,0 +1,58 @@
+import re
+import time
+from app.command_handler import execute_command, parse_input, print_result, set_interactive
+from app.exceptions import ExitProgram
+
+COLOR_PATTERN = re.compile(r'\033\[\d+m')
+
+
+class BatchReport:
+    def __init__(self):
+        self.commands = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self) -> float:
+        return self.commands / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        lines = [f"Executed {self.commands} commands in {self.elapsed:.2f} s "
+                 f"({self.throughput:.0f} commands/sec), {len(self.errors)} errors"]
+        for line_number, line, error in self.errors:
+            text = COLOR_PATTERN.sub('', str(error)).strip()
+            message = text.splitlines()[0] if text else type(error).__name__
+            lines.append(f"  line {line_number}: {line} - {message}")
+        return '\n'.join(lines)
+
+
+def run_batch(lines, output=None, quiet=False) -> BatchReport:
+    """Execute commands line by line without asking user for input
+
+    Empty lines and lines starting with '#' are skipped, 'exit' stops the batch.
+    """
+    report = BatchReport()
+    set_interactive(False)
+    started = time.perf_counter()
+    try:
+        for line_number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            command, *args = parse_input(line)
+            report.commands += 1
+            try:
+                result = execute_command(command, args)
+            except ExitProgram:
+                break
+            if isinstance(result, Exception):
+                report.errors.append((line_number, line, result))
+            if not quiet:
+                print_result(result, output)
+            elif hasattr(result, 'close'):
+                # a lazy result holds its transaction until it is consumed or closed
+                result.close()
+    finally:
+        report.elapsed = time.perf_counter() - started
+        set_interactive(True)
+    return report
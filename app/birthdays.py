@@ -1,4 +1,5 @@
-from datetime import datetime
+import calendar
+from datetime import date, datetime
 
 
 def get_birthdays_per_week(users_list):
@@ -34,13 +35,26 @@ def get_birthdays_per_week(users_list):
 
 
 def get_birthday_this_year(today, birthday: datetime):
+    birthday_this_year = get_anniversary(birthday, today.year)
+    if birthday_this_year < today:
+        birthday_this_year = get_anniversary(birthday, today.year + 1)
+    return birthday_this_year
+
+
+def get_anniversary(birthday: datetime, year: int):
     try:
-        birthday_this_year = birthday.replace(year=today.year)
+        return birthday.replace(year=year)
     # handle leap year exception
     except ValueError:
-        birthday_this_year = birthday.replace(day=birthday.day - 1)
-        birthday_this_year = birthday_this_year.replace(year=today.year)
+        return birthday.replace(year=year, day=birthday.day - 1)
 
-    if birthday_this_year < today:
-        birthday_this_year = birthday.replace(year=today.year + 1)
-    return birthday_this_year
+
+def get_celebrated_month_days(day: date) -> list[tuple[int, int]]:
+    """(month, day) of birthdays celebrated on the day
+
+    February 29 birthdays are celebrated on February 28 in common years.
+    """
+    month_days = [(day.month, day.day)]
+    if (day.month, day.day) == (2, 28) and not calendar.isleap(day.year):
+        month_days.append((2, 29))
+    return month_days
@@ -1,10 +1,82 @@
 import functools
+import sys
+import threading
 import types
+from datetime import date
+from importlib import import_module
 from app.exceptions import ValidationException, BotSyntaxException, \
-    DuplicateException, NotFoundException, ExitProgram, InvalidCommandError
-from app.util.string_utils import get_similarity_score
+    DuplicateException, NotFoundException, ExitProgram, InvalidCommandError, ConflictException
+from app.storage import storage
+from app.util import profiling
+from app.util.metrics import metrics
+from app.util.result_cache import result_cache
+from app.util.string_utils import sanitize_args
+from app.util.suggest import Suggester, format_suggestions
+
+
+class CommandSuggester(Suggester):
+    @staticmethod
+    def normalize(word: str) -> str:
+        return sanitize_args(word).lower()
+
 
 COMMANDS = dict[str, types.FunctionType]()
+COMMAND_SUGGESTER = CommandSuggester()
+READ_ONLY_COMMANDS = set[str]()
+SELF_LOCKING_COMMANDS = set[str]()
+CACHED_COMMANDS = dict[str, tuple[str, ...]]()
+COMMAND_MODULES = list[str]()
+COMMAND_MODULES_LOCK = threading.Lock()
+INTERACTIVE = True
+
+
+def register_module(module_name: str):
+    """Register a module with commands, it is imported when commands are needed first"""
+    COMMAND_MODULES.append(module_name)
+
+
+def load_commands():
+    with COMMAND_MODULES_LOCK:
+        while COMMAND_MODULES:
+            import_module(COMMAND_MODULES[0])
+            COMMAND_MODULES.pop(0)
+
+
+def parse_input(user_input):
+    try:
+        cmd, *args = user_input.split()
+    except:
+        return "Invalid command."
+    cmd = cmd.strip().lower()
+    return cmd, *args
+
+
+def read_input(prompt: str) -> str:
+    """Ask user for the value, there is nobody to ask in non-interactive mode"""
+    if not INTERACTIVE:
+        raise BotSyntaxException()
+    return input(prompt)
+
+
+def set_interactive(interactive: bool):
+    global INTERACTIVE
+    INTERACTIVE = interactive
+
+
+def format_result(result) -> str:
+    if isinstance(result, (str, Exception)) or not hasattr(result, '__next__'):
+        return str(result)
+    return ''.join(result)
+
+
+def print_result(result, file=None):
+    file = file or sys.stdout
+    if isinstance(result, (str, Exception)) or not hasattr(result, '__next__'):
+        print(result, file=file)
+        return
+    for chunk in result:
+        file.write(chunk)
+    file.write('\n')
 
 
 def create_invalid_command_response(command: str) -> str:
@@ -25,18 +97,10 @@ def get_syntax_error_msg(command: str) -> str:
 
 
 def find_similar_command(command: str) -> str:
-    similar_commands = dict()
-    for guessed_command in COMMANDS.keys():
-        score = get_similarity_score(command, guessed_command)
-        if score > 0:
-            similar_commands[guessed_command] = score
-
-    if not similar_commands:
+    guessed_commands = COMMAND_SUGGESTER.suggest(command)
+    if not guessed_commands:
         return None
-
-    max_score = max(similar_commands.values())
-    guessed_commands = [f"'{k}'" for k, v in similar_commands.items() if v == max_score]
-    return " or ".join(guessed_commands)
+    return format_suggestions(guessed_commands)
 
 
 def create_command_doc(command_name: str) -> str:
@@ -55,18 +119,37 @@ def create_command_description(command_name: str) -> str:
         return command.__doc__.split('\n')[0] if command.__doc__ else '-'
 
 
+def is_read_only(command: str) -> bool:
+    return command in READ_ONLY_COMMANDS
+
+
 def get_handler(command: str):
+    load_commands()
     handler = COMMANDS.get(command)
     if handler is None:
         raise InvalidCommandError('Invalid command.')
     return handler
 
 
-def command(name):
-    """Register a function as a plug-in"""
+def command(name, read_only=False, transaction=True, cache=()):
+    """Register a function as a plug-in
+
+    read_only marks commands which never change contacts or notes.
+    Commands run in a storage transaction unless transaction is False,
+    then the command opens transactions itself. cache names the storage
+    books ('contacts', 'notes') the result of a read-only command depends
+    on, the result is cached until they change.
+    """
 
     def register_command(func):
         COMMANDS[name] = func
+        COMMAND_SUGGESTER.add(name)
+        if read_only:
+            READ_ONLY_COMMANDS.add(name)
+        if not transaction:
+            SELF_LOCKING_COMMANDS.add(name)
+        if cache:
+            CACHED_COMMANDS[name] = tuple(cache)
         return func
 
     return register_command
@@ -77,7 +160,7 @@ def input_error(func):
     def inner(*args, **kwargs):
         try:
             return func(*args, **kwargs)
-        except (ValidationException, DuplicateException, NotFoundException) as e:
+        except (ValidationException, DuplicateException, NotFoundException, ConflictException) as e:
             return e
         except BotSyntaxException as e:
             return e
@@ -85,20 +168,20 @@ def input_error(func):
     return inner
 
 
-@command(name='hello')
+@command(name='hello', read_only=True)
 def hello(args) -> str:
     '''Just greet youself'''
     return 'How can I help you?'
 
 
-@command(name='exit')
-@command(name='close')
+@command(name='exit', read_only=True)
+@command(name='close', read_only=True)
 def exit(*args, **kwargs):
     '''Exit from assistant'''
     raise ExitProgram('Good bye!')
 
 
-@command(name='help')
+@command(name='help', read_only=True)
 def help(args):
     """Show info about all commands
     usage:
@@ -115,12 +198,177 @@ def help(args):
     return '\n'.join(lines)
 
 
+@command(name='stats', read_only=True)
+def stats(args):
+    """Show calls, latency percentiles, storage transactions and allocations of commands
+    usage:
+        stats [reset]
+    arguments:
+        reset - clear the statistics (optional)
+    """
+    if args == ['reset']:
+        metrics.reset()
+        result_cache.clear()
+        return "Statistics cleared."
+    if args:
+        raise BotSyntaxException()
+    return f"{metrics.report()}\n{result_cache.report()}"
+
+
+@command(name='profile', transaction=False)
+def profile(args):
+    """Run a command under cProfile and show the functions it spent the most time in
+    usage:
+        profile [command_name] [arguments]
+        profile --slow [milliseconds|off]
+    arguments:
+        command_name - command to run, followed by its arguments
+        --slow - profile every command and save profiles of those slower than
+                 the milliseconds to var/profiles, off stops it, without a value
+                 the current threshold is shown
+    """
+    if not args:
+        raise BotSyntaxException()
+    if args[0] == '--slow':
+        return set_slow_profiling(args[1:])
+    name, *command_args = args
+    name = name.lower()
+    if name not in COMMANDS:
+        return InvalidCommandError(create_invalid_command_response(name))
+    command_profile = profiling.CommandProfile(name, command_args)
+    output = command_profile.run(lambda: format_result(execute_command(name, command_args)))
+    if command_profile.profile is None:
+        return f"{output}\n\nAnother profiler is active, {name} took {command_profile.elapsed * 1000:.1f} ms"
+    return f"{output}\n\n{name} took {command_profile.elapsed * 1000:.1f} ms\n{profiling.report(command_profile.profile)}"
+
+
+def set_slow_profiling(args: list[str]) -> str:
+    if not args:
+        threshold = profiling.slow_threshold_ms
+        return "Slow commands are not profiled" if threshold is None else \
+            f"Commands slower than {threshold:g} ms are profiled to {profiling.profiles_path()}"
+    if args == ['off']:
+        profiling.set_slow_threshold(None)
+        return "Slow commands are not profiled"
+    try:
+        threshold = float(args[0])
+    except ValueError:
+        raise BotSyntaxException()
+    if len(args) > 1 or threshold < 0:
+        raise BotSyntaxException()
+    profiling.set_slow_threshold(threshold)
+    return f"Commands slower than {threshold:g} ms are profiled to {profiling.profiles_path()}"
+
+
+def books_stamp(books: tuple[str, ...]) -> tuple:
+    """State of the storage books, it changes with every change of them and with the day"""
+    stamp = [date.today()]
+    for name in books:
+        book = getattr(storage, name)
+        stamp += [book.token, book.generation]
+    return tuple(stamp)
+
+
+def run_cached(command: str, handler, args: list[str]):
+    """Handler result from the result cache, computed and cached on a miss"""
+    key = (command, tuple(args))
+    stamp = books_stamp(CACHED_COMMANDS[command])
+    result = result_cache.get(key, stamp)
+    if result is not None:
+        return result
+    result = handler(args)
+    if isinstance(result, types.GeneratorType):
+        return result_cache.collect(key, stamp, result)
+    if isinstance(result, str):
+        result_cache.put(key, stamp, result)
+    return result
+
+
+def run_in_transaction(command: str, handler, args: list[str], read_only: bool):
+    """Yield the handler result, then chunks of a lazy result, all in one transaction"""
+    with storage.transaction(read_only):
+        result = run_cached(command, handler, args) if command in CACHED_COMMANDS else handler(args)
+        yield result
+        if isinstance(result, types.GeneratorType):
+            yield from result
+
+
+def run_handler(command: str, args: list[str]):
+    handler = get_handler(command)
+    if command in SELF_LOCKING_COMMANDS:
+        return handler(args)
+    execution = run_in_transaction(command, handler, args, is_read_only(command))
+    result = next(execution)
+    if isinstance(result, types.GeneratorType):
+        return execution
+    execution.close()
+    return result
+
+
+def run_measured(command: str, args: list[str]):
+    """run_handler() recorded in metrics, a lazy result is measured until consumed"""
+    get_handler(command)
+    call = metrics.start(command)
+    profile = profiling.capture(command, args)
+    try:
+        result = profile.run(run_handler, command, args) if profile else run_handler(command, args)
+    except ExitProgram:
+        call.finish()
+        raise
+    except Exception:
+        call.finish(error=True)
+        if profile:
+            profile.finish()
+        raise
+    finally:
+        call.detach()
+    if isinstance(result, types.GeneratorType):
+        return MeasuredResult(result, call, profile)
+    if profile:
+        profile.finish()
+    call.finish(error=isinstance(result, Exception))
+    return result
+
+
+class MeasuredResult:
+    """Lazy command result, measured and profiled until it is consumed or closed"""
+
+    def __init__(self, result, call, profile=None):
+        self.result = result
+        self.call = call
+        self.profile = profile
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return self.profile.run(next, self.result) if self.profile else next(self.result)
+        except StopIteration:
+            self.finish()
+            raise
+        except Exception:
+            self.finish(error=True)
+            raise
+
+    def close(self):
+        self.result.close()
+        self.finish()
+
+    def finish(self, error: bool = False):
+        if self.call.finished:
+            return
+        if self.profile:
+            self.profile.finish()
+        self.call.finish(error)
+
+
 @input_error
 def execute_command(command: str, args: list[str]):
     try:
-        return get_handler(command)(args)
+        return run_measured(command, args)
     except InvalidCommandError:
-        return create_invalid_command_response(command)
+        return InvalidCommandError(create_invalid_command_response(command))
     except (BotSyntaxException, TypeError, ValueError, KeyError):
-        return get_syntax_error_msg(command)
+        return BotSyntaxException(get_syntax_error_msg(command))
 
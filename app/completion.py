@@ -0,0 +1,49 @@
+"""Tab completion of command and contact names in the interactive bot"""
+from app import constant
+from app.command_handler import COMMANDS, load_commands
+from app.storage import storage
+
+# commands taking a contact name as the first argument
+NAME_COMMANDS = {'add', 'change-phone', 'phone', 'add-birthday', 'show-birthday', 'del-contact',
+                 'add-email', 'add-ad'}
+
+
+def candidates(line: str, text: str) -> list[str]:
+    """Completions of the text, the last word of the line typed so far"""
+    words = line.split()
+    position = len(words) if not words or line[-1].isspace() else len(words) - 1
+    if position == 0:
+        load_commands()
+        return sorted(name for name in COMMANDS if name.startswith(text.lower()))
+    if position == 1 and words[0].lower() in NAME_COMMANDS:
+        with storage.read():
+            return storage.contacts.complete_name(text, constant.COMPLETION_LIMIT)
+    return []
+
+
+class Completer:
+    """readline completer, asked for the matches one by one until it returns None"""
+
+    def __init__(self, readline):
+        self.readline = readline
+        self.matches = []
+
+    def __call__(self, text: str, state: int) -> str | None:
+        if state == 0:
+            line = self.readline.get_line_buffer()[:self.readline.get_endidx()]
+            self.matches = candidates(line, text)
+        return self.matches[state] if state < len(self.matches) else None
+
+
+def install():
+    """Complete commands and contact names with the tab key where readline is available"""
+    try:
+        import readline
+    except ImportError:
+        return
+    readline.set_completer(Completer(readline))
+    readline.set_completer_delims(' \t')
+    if 'libedit' in (readline.__doc__ or ''):
+        readline.parse_and_bind('bind ^I rl_complete')
+    else:
+        readline.parse_and_bind('tab: complete')
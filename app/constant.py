@@ -1,6 +1,23 @@
 DATE_FORMAT = "%d.%m.%Y"
 PHONE_LEN = 10
+UNIQUE_PHONES = False
+WHO_IS_LIMIT = 50
+COMPLETION_LIMIT = 100
 TAG_LEN = 3
 NOTE_TEXT_LEN = 3
 STORAGE_FILE_NAME = "storage.bin"
 STORAGE_PATH = "var"
+STORAGE_ENGINE = "journal"
+SNAPSHOT_FSYNC = True
+AUTOSAVE_INTERVAL = 30
+JOURNAL_FILE_NAME = "storage.log"
+JOURNAL_COMPACT_THRESHOLD = 1000
+JOURNAL_FSYNC = False
+SQLITE_FILE_NAME = "storage.db"
+SQLITE_CACHE_SIZE = 10000
+MAPPED_FILE_NAME = "storage.map"
+SLOW_COMMAND_MS = 500
+PROFILES_DIR = "profiles"
+PROFILES_KEPT = 100
+TRANSFER_DIR = "transfer"
+RESULT_CACHE_BYTES = 32 * 1024 * 1024
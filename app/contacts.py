@@ -1,15 +1,40 @@
 from app import constant
-from collections import UserDict
+from app.util.index import KeyOrder
+from app.util.observable import ObservableDict
+from app.util.slots import Slotted
 from app.exceptions import ValidationException, DuplicateException, NotFoundException
-from datetime import date, datetime
-from app.birthdays import get_birthdays_per_week
+from datetime import date, datetime, timedelta
+from app.birthdays import get_birthdays_per_week, get_birthday_this_year
+from app.contacts_index import TrigramIndex, BirthdayIndex, PhoneIndex, NameIndex, NameSuggester, name_key
+from app.util.suggest import did_you_mean
 import re
 
+# lazily loaded books suggest among the names sharing the first letters
+NAME_SUGGEST_PREFIX = 2
+NAME_SUGGEST_CANDIDATES = 100
+
+
+class Field(Slotted):
+    __slots__ = ('_value',)
 
-class Field:
     def __init__(self, value):
         self.value = value
 
+    @classmethod
+    def restore(cls, value):
+        """Create field from a trusted stored value without validation"""
+        field = cls.__new__(cls)
+        field._value = value
+        return field
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, new_value):
+        self._value = new_value
+
     def __str__(self):
         return str(self.value)
 
@@ -18,11 +43,15 @@ class Field:
 
 
 class Name(Field):
+    __slots__ = ()
+
     def __init__(self, value):
         super().__init__(value)
 
 
 class Birthday(Field):
+    __slots__ = ()
+
     def __init__(self, value):
         super().__init__(value)
 
@@ -45,6 +74,8 @@ class Birthday(Field):
 
 
 class Phone(Field):
+    __slots__ = ()
+
     def __init__(self, value):
         super().__init__(value)
 
@@ -61,6 +92,8 @@ class Phone(Field):
 
 
 class Email(Field):
+    __slots__ = ()
+
     def __init__(self, email):
         super().__init__(email)
 
@@ -77,6 +110,8 @@ class Email(Field):
 
 
 class Address(Field):
+    __slots__ = ()
+
     def __init__(self, address):
         super().__init__(address)
 
@@ -91,19 +126,33 @@ class Address(Field):
         self._value = address
 
 
-class Record:
+class Record(Slotted):
+    __slots__ = ('name', 'birthday', 'phones', 'email', 'address', 'book')
+
     def __init__(self, name):
         self.name = Name(name)
         self.birthday = None
         self.phones = []
         self.email = None
         self.address = None
+        self.book = None
+
+    def _notify(self):
+        if self.book is not None:
+            self.book.notify(self.name.value, self)
+
+    def _check_owner(self, phone):
+        if self.book is not None:
+            self.book.check_phone_owner(self.name.value, phone)
 
     def add_phone(self, phone):
         phones = [phone.value for phone in self.phones]
         if phone in phones:
             raise DuplicateException("Phone already exists")
-        self.phones.append(Phone(phone))
+        new_phone = Phone(phone)
+        self._check_owner(new_phone.value)
+        self.phones.append(new_phone)
+        self._notify()
 
     def find_phone(self, phone):
         return next((p for p in self.phones if p.value == phone), None)
@@ -114,15 +163,19 @@ class Record:
             error_msg = f"Phone {old} number not found for record {self.name}"
             raise NotFoundException(error_msg)
 
+        self._check_owner(Phone(new).value)
         existing_phone.value = new
+        self._notify()
 
     def remove_phone(self, phone):
         existing_phone = self.find_phone(phone)
         if existing_phone:
             self.phones.remove(existing_phone)
+            self._notify()
 
     def add_birthday(self, date):
         self.birthday = Birthday(date)
+        self._notify()
 
     def get_birthday(self):
         return self.birthday if self.birthday else None
@@ -143,41 +196,234 @@ class Record:
 
     def add_email(self, email):
         self.email = Email(email)
+        self._notify()
 
     def add_address(self, address):
         self.address = Address(address)
+        self._notify()
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name.value,
+            'phones': [phone.value for phone in self.phones],
+            'birthday': str(self.birthday) if self.birthday else None,
+            'email': self.email.value if self.email else None,
+            'address': self.address.value if self.address else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        record = cls(data['name'])
+        record.phones = [Phone(phone) for phone in data.get('phones', [])]
+        if data.get('birthday'):
+            record.birthday = Birthday(data['birthday'])
+        if data.get('email'):
+            record.email = Email(data['email'])
+        if data.get('address'):
+            record.address = Address(data['address'])
+        return record
 
     def days_to_birthday(self, birthday: Birthday):
         if self.birthday:
             this_day = date.today()
-            birthday_day = date(this_day.year, self.birthday.value.month, self.birthday.value.day)
-            if birthday_day < this_day:
-                birthday_day = date(this_day.year + 1, self.birthday.value.month, self.birthday.value.day)
+            birthday_day = get_birthday_this_year(this_day, self.birthday.value)
             return (birthday_day - this_day).days
         else:
             return None
 
 
-class AddressBook(UserDict[str, Record]):
+class AddressBook(ObservableDict):
+    index_classes = {'search': TrigramIndex, 'birthdays': BirthdayIndex, 'phones': PhoneIndex,
+                     'names': NameIndex, 'suggest': NameSuggester, 'order': KeyOrder}
+
     def add_record(self, record: Record):
         key = record.name.value
+        for phone in record.phones:
+            self.check_phone_owner(key, phone.value)
+        self.data[key] = record
+        record.book = self
+        self.notify(key, record)
+
+    def merge_records(self, records) -> tuple[int, int, list[tuple[int, str]]]:
+        """Add the records, those with names already in the book are merged into the existing ones
+
+        Names are matched like by lookup(), also ignoring case.
+        Missing phones are appended, other fields given in the record replace
+        the existing values. Listeners are notified once for all the records.
+        When phones are unique, records with phones of other contacts are
+        rejected. Returns the numbers of added and merged records and the
+        rejected ones as (index of the record, message).
+        """
+        added = merged = 0
+        rejected = []
+        claimed = {}
+        # records changed by the batch, the book may keep them only once notified
+        changed = {}
+        # names added by the batch, not in the indexes until it is notified
+        added_names = {}
+        for index, record in enumerate(records):
+            key = record.name.value
+            existing = self.batch_record(key, changed)
+            if existing is None:
+                names = self.matching_names(key) + added_names.get(name_key(key), [])
+                if len(names) == 1:
+                    key = names[0]
+                    existing = self.batch_record(key, changed)
+            try:
+                self.check_new_phones(key, record.phones, claimed)
+            except DuplicateException as e:
+                rejected.append((index, str(e)))
+                continue
+            if existing is None:
+                record.book = self
+                self.data[key] = record
+                changed[key] = record
+                added_names.setdefault(name_key(key), []).append(key)
+                added += 1
+                continue
+            phones = {phone.value for phone in existing.phones}
+            existing.phones.extend(phone for phone in record.phones if phone.value not in phones)
+            for field in ('birthday', 'email', 'address'):
+                value = getattr(record, field)
+                if value is not None:
+                    setattr(existing, field, value)
+            changed[key] = existing
+            merged += 1
+        self.notify_many(changed.items())
+        return added, merged, rejected
+
+    def batch_record(self, key, changed: dict) -> Record | None:
+        """Record changed earlier in the batch, or the one of the book, which may be a fresh copy"""
+        record = changed.get(key)
+        return record if record is not None else self.data.get(key)
+
+    def apply_change(self, key, data: dict | None):
+        """Restore a journaled change without notifying listeners"""
+        if data is None:
+            self.data.pop(key, None)
+            self.update_indexes(key)
+            return
+        record = Record.from_dict(data)
+        record.book = self
         self.data[key] = record
+        self.update_indexes(key, record)
 
-    def find(self, name):
+    def lookup(self, name) -> Record:
+        """Record of the name, or of the only contact whose name differs from it just in case"""
         try:
             return self.data[name]
         except KeyError:
-            raise NotFoundException("Contact is not found")
+            pass
+        names = self.matching_names(name)
+        if len(names) == 1:
+            return self.data[names[0]]
+        raise NotFoundException("Contact is not found")
+
+    def find(self, name) -> Record:
+        """lookup() reporting similar names when the contact is not found"""
+        try:
+            return self.lookup(name)
+        except NotFoundException as e:
+            suggestions = self.matching_names(name) or self.suggest_names(name)
+            raise NotFoundException(did_you_mean(str(e), suggestions))
+
+    def matching_names(self, name: str) -> list[str]:
+        """Names equal to the name once casefolded"""
+        return sorted(self.index('names').get(name_key(name)))
+
+    def complete_name(self, prefix: str, limit: int) -> list[str]:
+        """At most limit names starting with the prefix, case-insensitive"""
+        index = self.index('names')
+        keys, _ = index.starting_with(name_key(prefix), limit)
+        return [name for key in keys for name in sorted(index.get(key))][:limit]
+
+    def suggest_names(self, name: str) -> list[str]:
+        return self.index('suggest').suggest(name)
+
+    def suggest_names_by_prefix(self, name: str) -> list[str]:
+        """suggest_names() for books not holding all the names in memory
+
+        Candidates are the first names starting with every prefix of the
+        name, so a typo is found unless it is in the first letters.
+        """
+        candidates = set()
+        for length in range(len(name), NAME_SUGGEST_PREFIX - 1, -1):
+            candidates.update(self.complete_name(name[:length], NAME_SUGGEST_CANDIDATES))
+        suggester = NameSuggester()
+        suggester.rebuild(candidates)
+        return suggester.suggest(name)
+
+    def phone_owners(self, phone: str) -> list[str]:
+        """Names of the contacts having the phone"""
+        return sorted(self.index('phones').get(phone))
+
+    def phones_starting_with(self, prefix: str, limit: int) -> tuple[dict[str, list[str]], int]:
+        """At most limit phones starting with the prefix with their owners and the number of all of them"""
+        index = self.index('phones')
+        phones, total = index.starting_with(prefix, limit)
+        return {phone: sorted(index.get(phone)) for phone in phones}, total
+
+    def check_phone_owner(self, name, phone: str):
+        """Raise DuplicateException if phones are unique and another contact has the phone"""
+        if not constant.UNIQUE_PHONES:
+            return
+        owners = [owner for owner in self.phone_owners(phone) if owner != name]
+        if owners:
+            raise DuplicateException(f"Phone {phone} already belongs to {owners[0]}")
+
+    def check_new_phones(self, name, phones: list[Phone], claimed: dict[str, str]):
+        """check_phone_owner() of the phones, also against the claimed ones mapped to their owners
+
+        Phones of the name are claimed once all are checked, so records
+        added in one batch don't share phones either.
+        """
+        if not constant.UNIQUE_PHONES:
+            return
+        for phone in phones:
+            self.check_phone_owner(name, phone.value)
+            owner = claimed.get(phone.value, name)
+            if owner != name:
+                raise DuplicateException(f"Phone {phone.value} already belongs to {owner}")
+        for phone in phones:
+            claimed[phone.value] = name
 
     def delete(self, name):
-        self.data.pop(name)
+        record = self.data.pop(name)
+        record.book = None
+        self.notify(name)
 
     def get_birthdays_per_week(self):
-        return get_birthdays_per_week(self.data)
+        today = date.today()
+        records = {record.name.value: record
+                   for delta in range(7)
+                   for record in self.birthdays_on_day(today + timedelta(days=delta))}
+        return get_birthdays_per_week(records)
+
+    def birthdays_on_day(self, day: date) -> list[Record]:
+        """Records celebrating birthday on the day"""
+        names = self.index('birthdays').celebrating_on(day)
+        return [self.data[name] for name in sorted(names)]
+
+    def birthdays_on_date(self, month: int, day: int) -> list[Record]:
+        """Records born on the day of month"""
+        names = self.index('birthdays').get((month, day))
+        return [self.data[name] for name in sorted(names)]
+
+    def birthdays_in_days(self, days: int) -> list[Record]:
+        if not 0 <= days <= 366:
+            return []
+        day = date.today() + timedelta(days=days)
+        return [record for record in self.birthdays_on_day(day)
+                if record.days_to_birthday(record.birthday) == days]
 
     def search(self, word: str):
+        candidates = self.index('search').candidates(word)
+        if candidates is None:
+            items = self.data.values()
+        else:
+            items = (self.data[name] for name in sorted(candidates))
         found_records = list()
-        for item in self.data.values():
+        for item in items:
             for field in item.get_all_fields():
                 if field.contains_word(word):
                     found_records.append(item)
@@ -1,9 +1,11 @@
 from app.command_handler import command
 from app.contacts import Record
 from app.storage import storage
-from app.exceptions import BotSyntaxException, NotFoundException
+from app.exceptions import BotSyntaxException, NotFoundException, ValidationException
 from datetime import date, datetime
-from app.constant import DATE_FORMAT
+from app.constant import DATE_FORMAT, WHO_IS_LIMIT
+from app.util.pagination import Page
+from app.util.transfer import transfer_args
 
 
 @command(name='add')
@@ -21,7 +23,7 @@ def add_contact(args):
     except Exception:
         raise BotSyntaxException()
     try:
-        existing_record = contacts.find(name)
+        existing_record = contacts.lookup(name)
         existing_record.add_phone(phone)
     except NotFoundException:
         record = Record(name)
@@ -51,7 +53,7 @@ def change_contact_phone(args):
         return "Contact changed."
 
 
-@command(name='phone')
+@command(name='phone', read_only=True)
 def get_phone(args):
     """Show contact phone
     usage:
@@ -67,6 +69,38 @@ def get_phone(args):
     return "; ".join(map(str, contacts.find(args[0]).phones))
 
 
+@command(name='who-is', read_only=True)
+def who_is(args):
+    """Show contacts having the phone, or phones starting with the digits followed by *
+    usage:
+        who-is [phone]
+        who-is [digits]*
+    arguments:
+        phone - phone number, 10 digits (example 0991911155)
+        digits - first digits of phone numbers (example 099*)
+    """
+    contacts = storage.contacts
+    if len(args) != 1:
+        raise BotSyntaxException()
+    phone = args[0]
+    if not phone.endswith('*'):
+        owners = contacts.phone_owners(phone)
+        if not owners:
+            raise NotFoundException(f"No contact has phone {phone}")
+        return f"{phone}: {', '.join(owners)}"
+
+    prefix = phone[:-1]
+    if prefix and not prefix.isdigit():
+        raise BotSyntaxException()
+    owners, total = contacts.phones_starting_with(prefix, WHO_IS_LIMIT)
+    if not owners:
+        raise NotFoundException(f"No contact has phone starting with {prefix}")
+    lines = [f"{phone}: {', '.join(names)}" for phone, names in owners.items()]
+    if total > len(owners):
+        lines.append(f"... and {total - len(owners)} more phones")
+    return "\n".join(lines)
+
+
 @command(name='add-birthday')
 def add_birthday(args):
     """Add contact birthday
@@ -87,7 +121,7 @@ def add_birthday(args):
         return "Birthday added."
 
 
-@command(name='show-birthday')
+@command(name='show-birthday', read_only=True)
 def show_birthday(args):
     """Show contact birthday
     usage:
@@ -101,15 +135,21 @@ def show_birthday(args):
     return contacts.find(args[0]).get_birthday()
 
 
-@command(name='all-contacts')
+@command(name='all-contacts', read_only=True, cache=('contacts',))
 def show_all_contacts(args):
     """Show all contacts
     usage:
-        all-contacts
+        all-contacts [--page N] [--size M] [--limit K] [--after contact_name]
+    arguments:
+        --page - number of the page to show (optional)
+        --size - number of contacts on a page, 20 by default (optional)
+        --limit - show at most K contacts (optional)
+        --after - continue the listing after the contact (optional)
     """
     contacts = storage.contacts
-
-    return ''.join([f"{record}" for record in contacts.values()])
+    page = Page.from_args(args)
+    records = contacts.values_after(page.after)
+    return page.render(records, key=lambda record: record.name.value, command='all-contacts')
 
 
 @command(name='del-contact')
@@ -126,13 +166,13 @@ def remove_contact(args):
     name = args[0]
     record = contacts.find(name)
     if record:
-        contacts.delete(name)
-        return f"Contact {name} removed from Address Book!"
+        contacts.delete(record.name.value)
+        return f"Contact {record.name} removed from Address Book!"
     else:
         raise KeyError
 
 
-@command('search-contacts')
+@command('search-contacts', read_only=True, cache=('contacts',))
 def search_contacts(args: list):
     """Search contacts on all the fields
     usage:
@@ -149,7 +189,7 @@ def search_contacts(args: list):
     return "".join([str(record) for record in result]) if result else "Nothing found."
 
 
-@command(name='birthdays')
+@command(name='birthdays', read_only=True, cache=('contacts',))
 def show_birthdays_next_week(args):
     """Show all birthdays in a week period
     usage:
@@ -165,7 +205,7 @@ def show_birthdays_next_week(args):
     return "\n".join(result)
 
 
-@command(name='birthdays-in-days')
+@command(name='birthdays-in-days', read_only=True)
 def show_birthday_n_days(args):
     """Show contacts with birthday in N days
     usage:
@@ -177,7 +217,7 @@ def show_birthday_n_days(args):
     if args and args[0].isdigit():
         days = int(args[0])
         result = f'List of users with birthday in {days} days:\n'
-        print_list = [contact for contact in contacts.values() if contact.days_to_birthday(contact.birthday) == days]
+        print_list = contacts.birthdays_in_days(days)
         for item in print_list:
             result += f'{item.name} date born {item.birthday}\n'
         return result if print_list else f'No birthdays in {days} days'
@@ -185,7 +225,7 @@ def show_birthday_n_days(args):
         return "Invalid input. Please provide a valid number of days."
 
 
-@command(name='birthdays-by-date')
+@command(name='birthdays-by-date', read_only=True)
 def date_birthday(args):
     """Show contacts with birthday by date
     usage:
@@ -202,10 +242,7 @@ def date_birthday(args):
     except ValueError:
         return "Invalid date format. Please provide a date in 'DD.MM' format."
 
-    birthday_contacts = [
-        contact for contact in contacts.values() if contact.birthday and
-                                                    contact.birthday.value.day == specific_date.day and
-                                                    contact.birthday.value.month == specific_date.month]
+    birthday_contacts = contacts.birthdays_on_date(specific_date.month, specific_date.day)
 
     if birthday_contacts:
         result = f"List of contacts with birthday on {specific_date}:\n"
@@ -259,3 +296,45 @@ def add_address(args):
             raise BotSyntaxException()
     else:
         raise BotSyntaxException()
+
+
+@command(name='import-contacts', transaction=False)
+def import_contacts(args):
+    """Import contacts from CSV, vCard or JSONL file
+    usage:
+        import-contacts [file] [--format csv|vcard|jsonl] [--workers N]
+    arguments:
+        file - file to import, the format is told by the extension (.csv, .vcf, .jsonl)
+        --format - file format when the extension doesn't tell it (optional)
+        --workers - number of processes validating the contacts (optional)
+    Contacts with names already in the book are merged into them.
+    """
+    from app import contacts_transfer
+    path, options = transfer_args(args, '--format', '--workers')
+    workers = options.get('workers', '1')
+    if not workers.isdigit() or int(workers) < 1:
+        raise BotSyntaxException()
+    try:
+        report = contacts_transfer.import_contacts(storage.contacts, path, options.get('format'), int(workers),
+                                                   transaction=storage.write)
+    except OSError as e:
+        raise ValidationException(f"Can't read {path}: {e.strerror}")
+    return str(report)
+
+
+@command(name='export-contacts', read_only=True)
+def export_contacts(args):
+    """Export all contacts to CSV, vCard or JSONL file
+    usage:
+        export-contacts [file] [--format csv|vcard|jsonl]
+    arguments:
+        file - file to write, the format is told by the extension (.csv, .vcf, .jsonl)
+        --format - file format when the extension doesn't tell it (optional)
+    """
+    from app import contacts_transfer
+    path, options = transfer_args(args, '--format')
+    try:
+        count = contacts_transfer.export_contacts(storage.contacts, path, options.get('format'))
+    except OSError as e:
+        raise ValidationException(f"Can't write {path}: {e.strerror}")
+    return f"Exported {count} contacts to {path}"
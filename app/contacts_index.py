@@ -0,0 +1,142 @@
+from bisect import bisect_left, insort
+from datetime import date
+from app.birthdays import get_celebrated_month_days
+from app.util.index import ReverseIndex
+from app.util.suggest import Suggester
+
+GRAM_LEN = 3
+
+
+class TrigramIndex(ReverseIndex):
+    """Substring index over the lowercased text of all record fields
+
+    Fields shorter than a trigram are indexed by their whole text.
+    """
+
+    def source(self, record):
+        return tuple(str(field).lower() for field in record.get_all_fields())
+
+    def terms(self, source) -> set:
+        grams = set()
+        for text in source:
+            if len(text) < GRAM_LEN:
+                grams.add(text)
+            else:
+                grams.update(text[i:i + GRAM_LEN] for i in range(len(text) - GRAM_LEN + 1))
+        return grams
+
+    def candidates(self, word: str) -> set | None:
+        """Keys of records which may contain the word, None if index can't help"""
+        word = word.lower()
+        if len(word) >= GRAM_LEN:
+            grams = sorted(self.terms([word]), key=lambda gram: len(self.get(gram)))
+            found = set(self.get(grams[0]))
+            for gram in grams[1:]:
+                if not found:
+                    break
+                found &= self.get(gram)
+            return found
+        if len(word) == GRAM_LEN - 1:
+            found = set(self.get(word))
+            for gram in self.entries:
+                if word in gram:
+                    found |= self.entries[gram]
+            return found
+        return None
+
+
+class BirthdayIndex(ReverseIndex):
+    """Calendar of record names bucketed by (month, day) of birthday"""
+
+    def source(self, record):
+        if not record.birthday:
+            return None
+        return record.birthday.value.month, record.birthday.value.day
+
+    def terms(self, source) -> set:
+        return {source}
+
+    def celebrating_on(self, day: date) -> set:
+        names = set()
+        for month_day in get_celebrated_month_days(day):
+            names |= self.get(month_day)
+        return names
+
+
+class SortedIndex(ReverseIndex):
+    """Reverse index keeping its terms sorted too, for prefix lookups
+
+    Terms added by a batch of changes are sorted in at once instead of
+    inserted one by one.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.sorted_terms = []
+        self.batch = None
+
+    def rebuild(self, items: dict):
+        self.entries.clear()
+        self.sources.clear()
+        self.sorted_terms = []
+        self.update_many(items.items())
+
+    def update_many(self, changes):
+        self.batch = []
+        try:
+            super().update_many(changes)
+        finally:
+            added, self.batch = self.batch, None
+            if added:
+                self.sorted_terms.extend(added)
+                self.sorted_terms.sort()
+
+    def term_added(self, term):
+        if self.batch is not None:
+            self.batch.append(term)
+        else:
+            insort(self.sorted_terms, term)
+
+    def term_removed(self, term):
+        position = bisect_left(self.sorted_terms, term)
+        if position < len(self.sorted_terms) and self.sorted_terms[position] == term:
+            del self.sorted_terms[position]
+        else:
+            self.batch.remove(term)
+
+    def starting_with(self, prefix: str, limit: int) -> tuple[list[str], int]:
+        """At most limit terms starting with the prefix in order and the number of all of them"""
+        low = bisect_left(self.sorted_terms, prefix)
+        high = bisect_left(self.sorted_terms, prefix + '\U0010ffff', low)
+        return self.sorted_terms[low:min(high, low + limit)], high - low
+
+
+class PhoneIndex(SortedIndex):
+    """Names of the contacts owning every phone, with the phones sorted for prefix lookups"""
+
+    def source(self, record):
+        return tuple(phone.value for phone in record.phones) or None
+
+    def terms(self, source) -> set:
+        return set(source)
+
+
+class NameIndex(SortedIndex):
+    """Contact names by their casefolded form, sorted for prefix lookups"""
+
+    def source(self, record):
+        return name_key(record.name.value)
+
+    def terms(self, source) -> set:
+        return {source}
+
+
+def name_key(name: str) -> str:
+    return name.casefold()
+
+
+class NameSuggester(Suggester):
+    """Suggestions of contact names, case-insensitive"""
+
+    def __init__(self):
+        super().__init__(substrings=False)
@@ -0,0 +1,247 @@
+import csv
+import json
+import sys
+from collections import deque
+from datetime import datetime
+from app import constant
+from app.contacts import AddressBook, Record
+from app.exceptions import ValidationException
+from app.snapshot import contact_row, contact_from_row
+from app.util.transfer import TransferReport, batched, guess_format, open_text
+
+FORMATS = {'.csv': 'csv', '.vcf': 'vcard', '.vcard': 'vcard', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+CSV_FIELDS = ['name', 'phones', 'birthday', 'email', 'address']
+
+
+# Readers yield (line number, contact dict in the Record.to_dict() layout)
+
+def read_csv(fh):
+    reader = csv.DictReader(fh)
+    for row in reader:
+        row = {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+        phones = row.get('phones') or row.get('phone') or ''
+        yield reader.line_num, {
+            'name': row.get('name', ''),
+            'phones': [phone for phone in phones.replace(',', ';').split(';') if phone.strip()],
+            'birthday': row.get('birthday') or None,
+            'email': row.get('email') or None,
+            'address': row.get('address') or None,
+        }
+
+
+def read_jsonl(fh):
+    for line_number, line in enumerate(fh, 1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            data = {'name': None, 'error': "Invalid JSON"}
+        if not isinstance(data, dict):
+            data = {'name': None, 'error': "Contact must be a JSON object"}
+        yield line_number, data
+
+
+def unfold_vcard(fh):
+    """Join folded vCard lines, continuation lines start with a space or tab"""
+    current, current_number = None, 0
+    for line_number, line in enumerate(fh, 1):
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current_number, current
+        current, current_number = line, line_number
+    if current is not None:
+        yield current_number, current
+
+
+def unescape_vcard(value: str) -> str:
+    return (value.replace('\\n', '\n').replace('\\N', '\n').replace('\\,', ',')
+            .replace('\\;', ';').replace('\\\\', '\\'))
+
+
+def escape_vcard(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace(',', '\\,').replace(';', '\\;')
+
+
+def parse_vcard_date(value: str) -> str:
+    """vCard BDAY (YYYY-MM-DD or YYYYMMDD) in the bot date format"""
+    for pattern in ('%Y-%m-%d', '%Y%m%d'):
+        try:
+            return datetime.strptime(value, pattern).strftime(constant.DATE_FORMAT)
+        except ValueError:
+            continue
+    return value
+
+
+def read_vcard(fh):
+    contact, start = None, 0
+    for line_number, line in unfold_vcard(fh):
+        name, _, value = line.partition(':')
+        name = name.split(';')[0].upper()
+        if name == 'BEGIN':
+            contact, start = {'name': None, 'phones': []}, line_number
+        elif contact is None:
+            continue
+        elif name == 'END':
+            yield start, contact
+            contact = None
+        elif name == 'FN':
+            contact['name'] = unescape_vcard(value).strip()
+        elif name == 'N' and not contact['name']:
+            contact['name'] = ' '.join(part for part in reversed(unescape_vcard(value).split(';')[:2]) if part)
+        elif name == 'TEL':
+            contact['phones'].append(''.join(char for char in value if char.isdigit()))
+        elif name == 'BDAY':
+            contact['birthday'] = parse_vcard_date(value.strip())
+        elif name == 'EMAIL':
+            contact['email'] = value.strip()
+        elif name == 'ADR':
+            parts = [unescape_vcard(part).strip() for part in value.split(';')]
+            contact['address'] = ', '.join(part for part in parts if part) or None
+
+
+# Writers stream records of the book
+
+def write_csv(fh, records):
+    writer = csv.writer(fh)
+    writer.writerow(CSV_FIELDS)
+    for record in records:
+        data = record.to_dict()
+        writer.writerow([data['name'], ';'.join(data['phones']), data['birthday'] or '',
+                         data['email'] or '', data['address'] or ''])
+
+
+def write_jsonl(fh, records):
+    for record in records:
+        fh.write(json.dumps(record.to_dict(), ensure_ascii=False) + '\n')
+
+
+def write_vcard(fh, records):
+    for record in records:
+        lines = ['BEGIN:VCARD', 'VERSION:3.0', f"FN:{escape_vcard(record.name.value)}",
+                 f"N:;{escape_vcard(record.name.value)};;;"]
+        lines += [f"TEL;TYPE=CELL:{phone.value}" for phone in record.phones]
+        if record.birthday:
+            lines.append(f"BDAY:{record.birthday.value.isoformat()}")
+        if record.email:
+            lines.append(f"EMAIL:{record.email.value}")
+        if record.address:
+            lines.append(f"ADR:;;{escape_vcard(record.address.value)};;;;")
+        lines.append('END:VCARD')
+        fh.write('\r\n'.join(lines) + '\r\n')
+
+
+READERS = {'csv': read_csv, 'vcard': read_vcard, 'jsonl': read_jsonl}
+WRITERS = {'csv': write_csv, 'vcard': write_vcard, 'jsonl': write_jsonl}
+
+
+def check_types(data: dict):
+    """Values parsed from JSON may be of any type, the record fields take strings only"""
+    if not isinstance(data['name'], str):
+        raise ValidationException("Contact name must be a string")
+    phones = data.get('phones', [])
+    if not isinstance(phones, list) or not all(isinstance(phone, str) for phone in phones):
+        raise ValidationException("Phones must be a list of strings")
+    for field in ('birthday', 'email', 'address'):
+        if data.get(field) and not isinstance(data[field], str):
+            raise ValidationException(f"Contact {field} must be a string")
+
+
+def validate_batch(batch: list[tuple[int, dict]]) -> list[tuple[int, Record | str]]:
+    """Build records of the contacts, invalid ones are replaced by the error message"""
+    validated = []
+    for line_number, data in batch:
+        try:
+            if data.get('error'):
+                raise ValidationException(data['error'])
+            if not data.get('name'):
+                raise ValidationException("Contact name is missing")
+            check_types(data)
+            record = Record.from_dict(data)
+            record.phones = list({phone.value: phone for phone in record.phones}.values())
+            validated.append((line_number, record))
+        except (ValidationException, TypeError, AttributeError) as e:
+            validated.append((line_number, str(e) or type(e).__name__))
+    return validated
+
+
+def validate_rows(batch: list[tuple[int, dict]]) -> list[tuple[int, tuple | str]]:
+    """validate_batch() for worker processes, records travel back as snapshot rows,
+    which are much cheaper to pickle and restore than the records themselves"""
+    return [(line_number, result if isinstance(result, str) else contact_row(result))
+            for line_number, result in validate_batch(batch)]
+
+
+def validated_batches(batches, workers: int):
+    """Validate batches in order, in worker processes when there are more than one
+
+    At most two batches per worker are in flight, so the memory stays
+    bounded for any size of the input.
+    """
+    if workers <= 1:
+        yield from map(validate_batch, batches)
+        return
+    from multiprocessing import Pool
+    with Pool(workers) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.apply_async(validate_rows, (batch,)))
+            if len(pending) >= workers * 2:
+                yield restore_records(pending.popleft().get())
+        while pending:
+            yield restore_records(pending.popleft().get())
+
+
+def restore_records(batch: list[tuple[int, tuple | str]]) -> list[tuple[int, Record | str]]:
+    return [(line_number, result if isinstance(result, str) else contact_from_row(result, None))
+            for line_number, result in batch]
+
+
+def import_contacts(book: AddressBook, path: str, file_format: str = None, workers: int = 1,
+                    transaction=None, progress=sys.stderr) -> TransferReport:
+    """Stream contacts of the file into the book
+
+    Batches of contacts are validated, possibly in worker processes, and
+    merged into the book each in its own transaction.
+    """
+    reader = READERS[guess_format(path, FORMATS, file_format)]
+    report = TransferReport('records', progress)
+    with open_text(path, 'r') as fh:
+        for batch in validated_batches(batched(reader(fh)), workers):
+            records = []
+            line_numbers = []
+            for line_number, result in batch:
+                if isinstance(result, str):
+                    report.add_error(f"line {line_number}", result)
+                else:
+                    records.append(result)
+                    line_numbers.append(line_number)
+            if transaction:
+                with transaction():
+                    added, updated, rejected = book.merge_records(records)
+            else:
+                added, updated, rejected = book.merge_records(records)
+            for index, message in rejected:
+                report.add_error(f"line {line_numbers[index]}", message)
+            report.added += added
+            report.updated += updated
+            report.count(len(batch))
+    return report
+
+
+def export_contacts(book: AddressBook, path: str, file_format: str = None) -> int:
+    writer = WRITERS[guess_format(path, FORMATS, file_format)]
+    exported = 0
+
+    def counted(records):
+        nonlocal exported
+        for record in records:
+            exported += 1
+            yield record
+
+    with open_text(path, 'w') as fh:
+        writer(fh, counted(book.values()))
+    return exported
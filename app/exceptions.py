@@ -20,3 +20,7 @@ class ExitProgram(Exception):
 
 class InvalidCommandError(Exception):
     pass
+
+
+class ConflictException(Exception):
+    pass
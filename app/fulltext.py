@@ -0,0 +1,148 @@
+import math
+import re
+
+WORD_PATTERN = re.compile(r"\w+")
+QUERY_PATTERN = re.compile(r'"[^"]*"?|\S+')
+
+
+def tokenize(text: str) -> list[str]:
+    return [word.casefold() for word in WORD_PATTERN.findall(text)]
+
+
+def parse_query(query: str):
+    """Parse search query to a tree of ('or'|'and', [nodes]) and ('phrase', [terms])
+
+    Words are joined by OR unless AND stands between them, AND binds
+    tighter than OR and "quoted words" are matched as a phrase.
+    """
+    alternatives = [[]]
+    join_next = False
+    for token in QUERY_PATTERN.findall(query):
+        if token == 'OR':
+            join_next = False
+            continue
+        if token == 'AND':
+            join_next = bool(alternatives[-1])
+            continue
+        terms = tokenize(token)
+        if not terms:
+            continue
+        if not join_next and alternatives[-1]:
+            alternatives.append([])
+        alternatives[-1].append(('phrase', terms))
+        join_next = False
+    return ('or', [('and', group) for group in alternatives if group])
+
+
+def query_terms(node) -> set:
+    kind, children = node
+    if kind == 'phrase':
+        return set(children)
+    return set().union(*(query_terms(child) for child in children))
+
+
+class FullTextIndex:
+    """Inverted index of note texts with BM25 ranking"""
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.postings = {}
+        self.documents = {}
+        self.total_length = 0
+
+    def rebuild(self, notes: dict):
+        self.postings.clear()
+        self.documents.clear()
+        self.total_length = 0
+        for id, note in notes.items():
+            self.update(id, note)
+
+    def update(self, id, note=None):
+        tokens = tuple(tokenize(note.text.value)) if note is not None and note.text else None
+        old_tokens = self.documents.get(id)
+        if tokens == old_tokens:
+            return
+        if old_tokens is not None:
+            self.remove(id, old_tokens)
+        if tokens:
+            self.add(id, tokens)
+
+    def update_many(self, changes):
+        for id, note in changes:
+            self.update(id, note)
+
+    def add(self, id, tokens: tuple):
+        self.documents[id] = tokens
+        self.total_length += len(tokens)
+        positions = {}
+        for position, term in enumerate(tokens):
+            term_positions = positions.get(term)
+            if term_positions is None:
+                positions[term] = [position]
+            else:
+                term_positions.append(position)
+        postings = self.postings
+        for term, term_positions in positions.items():
+            documents = postings.get(term)
+            if documents is None:
+                postings[term] = {id: term_positions}
+            else:
+                documents[id] = term_positions
+
+    def remove(self, id, tokens: tuple):
+        del self.documents[id]
+        self.total_length -= len(tokens)
+        for term in set(tokens):
+            documents = self.postings[term]
+            documents.pop(id, None)
+            if not documents:
+                del self.postings[term]
+
+    def search(self, query: str) -> list:
+        """Return ids of notes matching the query, best ranked first"""
+        tree = parse_query(query)
+        found = self.match(tree)
+        scores = {id: self.score(id, query_terms(tree)) for id in found}
+        return sorted(found, key=lambda id: (-scores[id], id))
+
+    def match(self, node) -> set:
+        kind, children = node
+        if kind == 'phrase':
+            return self.match_phrase(children)
+        results = [self.match(child) for child in children]
+        if not results:
+            return set()
+        if kind == 'and':
+            return set.intersection(*results)
+        return set.union(*results)
+
+    def match_phrase(self, terms: list) -> set:
+        postings = [self.postings.get(term, {}) for term in terms]
+        found = set(min(postings, key=len))
+        for documents in postings:
+            found &= documents.keys()
+        if len(terms) == 1:
+            return found
+        return {id for id in found if self.has_sequence(id, postings)}
+
+    @staticmethod
+    def has_sequence(id, postings: list) -> bool:
+        following = [set(documents[id]) for documents in postings[1:]]
+        return any(all(start + offset in positions for offset, positions in enumerate(following, 1))
+                   for start in postings[0][id])
+
+    def score(self, id, terms: set) -> float:
+        count = len(self.documents)
+        average_length = self.total_length / count
+        length = len(self.documents[id])
+        score = 0.0
+        for term in terms:
+            documents = self.postings.get(term, {})
+            frequency = len(documents.get(id, ()))
+            if not frequency:
+                continue
+            idf = math.log(1 + (count - len(documents) + 0.5) / (len(documents) + 0.5))
+            score += idf * frequency * (self.K1 + 1) / (
+                frequency + self.K1 * (1 - self.B + self.B * length / average_length))
+        return score
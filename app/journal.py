@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+
+class Journal:
+    """Append-only log of book changes
+
+    Every line is a JSON change record {"b": book, "k": key, "v": item},
+    where item is the full item state or null when the item was deleted.
+    Replaying the records in order on top of a snapshot restores the state.
+    """
+
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = Path(path)
+        self.rotated_path = self.path.with_name(self.path.name + '.1')
+        self.fsync = fsync
+        self.size = 0
+        self.lock = threading.Lock()
+        self.__fh = None
+
+    def open(self):
+        self.size = self.count(self.path)
+        self.__fh = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        with self.lock:
+            if self.__fh:
+                self.__fh.close()
+                self.__fh = None
+
+    def append(self, book_name: str, key, item=None):
+        self.append_many(book_name, [(key, item)])
+
+    def append_many(self, book_name: str, changes):
+        """Write the (key, item) changes with a single flush"""
+        lines = [json.dumps({'b': book_name, 'k': key, 'v': item.to_dict() if item is not None else None},
+                            ensure_ascii=False, separators=(',', ':')) + '\n'
+                 for key, item in changes]
+        with self.lock:
+            self.__fh.writelines(lines)
+            self.__fh.flush()
+            if self.fsync:
+                os.fsync(self.__fh.fileno())
+            self.size += len(lines)
+
+    def rotate(self) -> bool:
+        """Move the current segment aside for compaction and start a new one"""
+        with self.lock:
+            if self.rotated_path.exists():
+                return False
+            self.__fh.close()
+            os.replace(self.path, self.rotated_path)
+            self.__fh = open(self.path, 'a', encoding='utf-8')
+            self.size = 0
+            return True
+
+    def segments(self) -> list[Path]:
+        return [path for path in (self.rotated_path, self.path) if path.exists()]
+
+    @staticmethod
+    def count(path: Path) -> int:
+        try:
+            with open(path, 'rb') as fh:
+                return sum(1 for _ in fh)
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def read(path: Path):
+        with open(path, 'r', encoding='utf-8') as fh:
+            for line in fh:
+                try:
+                    change = json.loads(line)
+                except json.JSONDecodeError:
+                    # torn write of the last line after a crash
+                    break
+                yield change['b'], change['k'], change['v']
+
+    @classmethod
+    def replay(cls, books: dict, segments: list[Path]):
+        for segment in segments:
+            for book_name, key, data in cls.read(segment):
+                books[book_name].apply_change(key, data)
@@ -0,0 +1,446 @@
+import mmap
+import os
+import struct
+from collections.abc import MutableMapping
+from app import constant
+from app.contacts import AddressBook
+from app.contacts_index import NameIndex, PhoneIndex, name_key
+from app.notes import NoteBook
+from app.snapshot import contact_row, contact_from_row, note_row, note_from_row
+
+MAGIC = b'C4MMAP'
+FORMAT_VERSION = 2
+# version 1 sorted the names by their bytes, not casefolded
+READ_VERSIONS = (1, 2)
+NONE = 0xFFFFFFFF
+
+HEADER = struct.Struct('<6sHIII6Q')
+CONTACT = struct.Struct('<IIiIIIIII')
+NOTE = struct.Struct('<IIIII')
+POSITION = struct.Struct('<I')
+PHONE_ENTRY = struct.Struct(f'<{constant.PHONE_LEN}sI')
+NOTE_ID = struct.Struct('<II')
+
+
+class StringPool:
+    def __init__(self):
+        self.data = bytearray()
+
+    def add(self, value: str | None) -> tuple[int, int]:
+        if value is None:
+            return 0, NONE
+        encoded = value.encode('utf-8')
+        offset = len(self.data)
+        self.data += encoded
+        return offset, len(encoded)
+
+
+def dump(fh, book: AddressBook, notes: NoteBook):
+    """Write the books in the layout read in place by MappedSnapshot
+
+    Fixed size entries of contacts and notes in the book order point into
+    one string pool. Contacts are indexed by casefolded name and by phone,
+    notes by id, all indexes are sorted arrays searched with bisection.
+    """
+    pool = StringPool()
+    contacts = bytearray()
+    names = []
+    phones = []
+    for position, record in enumerate(book.values()):
+        name, birthday, record_phones, email, address = contact_row(record)
+        name_offset, name_length = pool.add(name)
+        phones_offset, _ = pool.add(''.join(record_phones))
+        contacts += CONTACT.pack(name_offset, name_length, birthday or 0, *pool.add(email), *pool.add(address),
+                                 phones_offset, len(record_phones))
+        names.append((name_key(name), name.encode('utf-8'), position))
+        phones.extend((phone.encode('ascii'), position) for phone in record_phones)
+    entries = bytearray()
+    ids = []
+    for position, note in enumerate(notes.values()):
+        id, text, tags = note_row(note)
+        entries += NOTE.pack(id, *pool.add(text), *pool.add('\n'.join(tags)))
+        ids.append((id, position))
+    names.sort()
+    phones.sort()
+    ids.sort()
+
+    sections = [
+        bytes(contacts),
+        b''.join(POSITION.pack(position) for _, _, position in names),
+        b''.join(PHONE_ENTRY.pack(phone, position) for phone, position in phones),
+        bytes(entries),
+        b''.join(NOTE_ID.pack(id, position) for id, position in ids),
+        pool.data,
+    ]
+    offsets = []
+    offset = HEADER.size
+    for section in sections:
+        offsets.append(offset)
+        offset += len(section)
+    fh.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(names), len(ids), notes.last_id, *offsets))
+    for section in sections:
+        fh.write(section)
+
+
+class MappedSnapshot:
+    """Read-only view of a snapshot file mapped into memory
+
+    Entries are decoded on request only, so opening the snapshot costs
+    the same for any number of contacts and notes.
+    """
+
+    def __init__(self, path: str):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            self.map = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        magic, version, self.contacts_count, self.notes_count, self.last_id, *offsets = \
+            HEADER.unpack_from(self.map)
+        if magic != MAGIC or version not in READ_VERSIONS:
+            self.close()
+            raise ValueError(f"{path} is not a mapped snapshot of version {FORMAT_VERSION}")
+        self.folded_names = version >= 2
+        self.contacts, self.names, self.phones, self.notes, self.ids, self.pool = offsets
+
+    def close(self):
+        self.map.close()
+
+    def string(self, offset: int, length: int) -> str | None:
+        if length == NONE:
+            return None
+        start = self.pool + offset
+        return self.map[start:start + length].decode('utf-8')
+
+    def contact_entry(self, position: int) -> tuple:
+        return CONTACT.unpack_from(self.map, self.contacts + position * CONTACT.size)
+
+    def contact_name(self, position: int) -> str:
+        name_offset, name_length, *_ = self.contact_entry(position)
+        return self.string(name_offset, name_length)
+
+    def contact(self, position: int) -> tuple:
+        """Contact row in the snapshot.contact_row() layout"""
+        (name_offset, name_length, birthday, email_offset, email_length,
+         address_offset, address_length, phones_offset, phones_count) = self.contact_entry(position)
+        phones = self.string(phones_offset, phones_count * constant.PHONE_LEN)
+        return (
+            self.string(name_offset, name_length),
+            birthday or None,
+            tuple(phones[i:i + constant.PHONE_LEN] for i in range(0, len(phones), constant.PHONE_LEN)),
+            self.string(email_offset, email_length),
+            self.string(address_offset, address_length),
+        )
+
+    def name_bytes(self, index: int) -> bytes:
+        """Name of the contact at the index of the sorted name index"""
+        position, = POSITION.unpack_from(self.map, self.names + index * POSITION.size)
+        name_offset, name_length, *_ = self.contact_entry(position)
+        start = self.pool + name_offset
+        return self.map[start:start + name_length]
+
+    def name_position(self, index: int) -> int:
+        return POSITION.unpack_from(self.map, self.names + index * POSITION.size)[0]
+
+    def find_contact(self, name: str) -> int | None:
+        """Position of the contact with the name"""
+        key = name.encode('utf-8')
+        if self.folded_names:
+            folded = name_key(name)
+            for index in range(self.key_bound(folded), self.contacts_count):
+                current = self.name_bytes(index)
+                if current == key:
+                    return self.name_position(index)
+                if name_key(current.decode('utf-8')) != folded:
+                    return None
+            return None
+        low, high = 0, self.contacts_count
+        while low < high:
+            middle = (low + high) // 2
+            current = self.name_bytes(middle)
+            if current == key:
+                return self.name_position(middle)
+            if current < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def key_bound(self, key: str) -> int:
+        """Index of the first name not casefolded before the key in the name index"""
+        low, high = 0, self.contacts_count
+        while low < high:
+            middle = (low + high) // 2
+            if name_key(self.name_bytes(middle).decode('utf-8')) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def names_with_key(self, key: str) -> list[str]:
+        """Names equal to the casefolded key once casefolded"""
+        found = []
+        for index in range(self.key_bound(key), self.contacts_count):
+            name = self.name_bytes(index).decode('utf-8')
+            if name_key(name) != key:
+                break
+            found.append(name)
+        return found
+
+    def names_starting_with(self, prefix: str, limit: int) -> list[str]:
+        """At most limit names starting with the casefolded prefix once casefolded, in their order"""
+        found = []
+        for index in range(self.key_bound(prefix), self.contacts_count):
+            name = self.name_bytes(index).decode('utf-8')
+            if len(found) == limit or not name_key(name).startswith(prefix):
+                break
+            found.append(name)
+        return found
+
+    def phone_entry(self, index: int) -> tuple[str, int]:
+        phone, position = PHONE_ENTRY.unpack_from(self.map, self.phones + index * PHONE_ENTRY.size)
+        return phone.decode('ascii'), position
+
+    def phone_bound(self, key: bytes) -> int:
+        """Index of the first phone index entry not before the key"""
+        low, high = 0, self.phones_count
+        while low < high:
+            middle = (low + high) // 2
+            current, _ = PHONE_ENTRY.unpack_from(self.map, self.phones + middle * PHONE_ENTRY.size)
+            if current < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    @property
+    def phones_count(self) -> int:
+        # the phone index ends where the notes table starts
+        return (self.notes - self.phones) // PHONE_ENTRY.size
+
+    def find_phone(self, phone: str) -> list[int]:
+        """Positions of contacts having the phone"""
+        return [position for _, position in self.phones_starting_with(phone)]
+
+    def phones_starting_with(self, prefix: str):
+        """(phone, position) entries of the phones starting with the prefix, in the phone order"""
+        key = prefix.encode('ascii')
+        for index in range(self.phone_bound(key), self.phones_count):
+            phone, position = self.phone_entry(index)
+            if not phone.startswith(prefix):
+                break
+            yield phone, position
+
+    def note(self, position: int) -> tuple:
+        """Note row in the snapshot.note_row() layout"""
+        id, text_offset, text_length, tags_offset, tags_length = \
+            NOTE.unpack_from(self.map, self.notes + position * NOTE.size)
+        tags = self.string(tags_offset, tags_length)
+        return id, self.string(text_offset, text_length), tuple(tags.split('\n')) if tags else ()
+
+    def note_id(self, position: int) -> int:
+        return NOTE.unpack_from(self.map, self.notes + position * NOTE.size)[0]
+
+    def find_note(self, id: int) -> int | None:
+        low, high = 0, self.notes_count
+        while low < high:
+            middle = (low + high) // 2
+            current, position = NOTE_ID.unpack_from(self.map, self.ids + middle * NOTE_ID.size)
+            if current == id:
+                return position
+            if current < id:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+
+class MappedMap(MutableMapping):
+    """Book items in the mapped snapshot overlaid by the changed ones
+
+    Items read from the snapshot are materialized for the caller only,
+    the book keeps those reported as changed, new and deleted keys.
+    """
+
+    def __init__(self, book):
+        self.book = book
+        self.changed = {}
+        self.added = {}
+        self.deleted = set()
+        # snapshot positions of the changed and deleted items
+        self.hidden = set()
+
+    def __getitem__(self, key):
+        item = self.changed.get(key)
+        if item is not None:
+            return item
+        if key in self.deleted:
+            raise KeyError(key)
+        position = self.book.find_position(key)
+        if position is None:
+            raise KeyError(key)
+        return self.book.item_at(position)
+
+    def __setitem__(self, key, item):
+        self.changed[key] = item
+        if key in self.deleted:
+            self.deleted.discard(key)
+            return
+        position = self.book.find_position(key)
+        if position is None:
+            self.added[key] = None
+        else:
+            self.hidden.add(position)
+
+    def __delitem__(self, key):
+        self[key]
+        self.changed.pop(key, None)
+        if key in self.added:
+            del self.added[key]
+        else:
+            self.deleted.add(key)
+            self.hidden.add(self.book.find_position(key))
+
+    def __contains__(self, key):
+        return key in self.changed or (key not in self.deleted and self.book.find_position(key) is not None)
+
+    def __iter__(self):
+        return self.keys_from(0)
+
+    def keys_from(self, start: int):
+        for position in range(start, self.book.snapshot_count()):
+            key = self.book.key_at(position)
+            if key not in self.deleted:
+                yield key
+        yield from list(self.added)
+
+    def keys_after(self, key):
+        """Keys following the key of the map, the preceding snapshot keys are not read"""
+        if key in self.added:
+            added = list(self.added)
+            return iter(added[added.index(key) + 1:])
+        return self.keys_from(self.book.find_position(key) + 1)
+
+    def __len__(self):
+        return self.book.snapshot_count() - len(self.deleted) + len(self.added)
+
+
+class MappedBook:
+    """Common access of the books backed by a mapped snapshot"""
+
+    def attach_snapshot(self, snapshot: MappedSnapshot):
+        self.snapshot = snapshot
+        self.data = MappedMap(self)
+
+    def values_after(self, key=None):
+        if key is None or key not in self.data:
+            return super().values_after(key)
+        return (self.data[current] for current in self.data.keys_after(key))
+
+    def notify(self, key, item=None):
+        if item is not None:
+            self.data[key] = item
+        super().notify(key, item)
+
+    def notify_many(self, changes):
+        changes = list(changes)
+        for key, item in changes:
+            if item is not None:
+                self.data[key] = item
+        super().notify_many(changes)
+
+
+class MappedAddressBook(MappedBook, AddressBook):
+    """Contacts of the mapped snapshot overlaid by the changed ones
+
+    Phones are looked up in the phone index of the snapshot and in an
+    index of the contacts changed since, not in one built over all contacts.
+    """
+
+    def __init__(self, snapshot: MappedSnapshot):
+        super().__init__()
+        self.attach_snapshot(snapshot)
+        self.changed_phones = PhoneIndex()
+        self.changed_names = NameIndex()
+
+    def update_indexes(self, key, item=None):
+        self.changed_phones.update(key, item)
+        self.changed_names.update(key, item)
+        super().update_indexes(key, item)
+
+    def update_indexes_many(self, changes: list):
+        self.changed_phones.update_many(changes)
+        self.changed_names.update_many(changes)
+        super().update_indexes_many(changes)
+
+    def phone_owners(self, phone: str) -> list[str]:
+        names = [self.key_at(position) for position in self.snapshot.find_phone(phone)
+                 if position not in self.data.hidden]
+        return sorted(names + list(self.changed_phones.get(phone)))
+
+    def phones_starting_with(self, prefix: str, limit: int) -> tuple[dict[str, list[str]], int]:
+        changed_phones, _ = self.changed_phones.starting_with(prefix, len(self.changed_phones.sorted_terms))
+        entries = [(phone, position) for phone, position in self.snapshot.phones_starting_with(prefix)
+                   if position not in self.data.hidden]
+        phones = sorted({phone for phone, _ in entries}.union(changed_phones))
+        owners = {phone: list(self.changed_phones.get(phone)) for phone in phones[:limit]}
+        for phone, position in entries:
+            if phone in owners:
+                owners[phone].append(self.key_at(position))
+        return {phone: sorted(names) for phone, names in owners.items()}, len(phones)
+
+    def snapshot_count(self) -> int:
+        return self.snapshot.contacts_count
+
+    def find_position(self, name) -> int | None:
+        return self.snapshot.find_contact(name) if isinstance(name, str) else None
+
+    def key_at(self, position: int) -> str:
+        return self.snapshot.contact_name(position)
+
+    def names_starting_with(self, prefix: str, limit: int) -> list[str]:
+        """Names of the book starting with the casefolded prefix once casefolded, sorted so"""
+        snapshot_names = self.snapshot.names_starting_with(prefix, limit + len(self.data.deleted))
+        names = {name for name in snapshot_names if name not in self.data.deleted}
+        keys, _ = self.changed_names.starting_with(prefix, limit)
+        names.update(name for key in keys for name in self.changed_names.get(key))
+        return sorted(names, key=lambda name: (name_key(name), name))[:limit]
+
+    def matching_names(self, name: str) -> list[str]:
+        if not self.snapshot.folded_names:
+            return super().matching_names(name)
+        key = name_key(name)
+        names = {found for found in self.snapshot.names_with_key(key) if found not in self.data.deleted}
+        return sorted(names | self.changed_names.get(key))
+
+    def complete_name(self, prefix: str, limit: int) -> list[str]:
+        if not self.snapshot.folded_names:
+            return super().complete_name(prefix, limit)
+        return self.names_starting_with(name_key(prefix), limit)
+
+    def suggest_names(self, name: str) -> list[str]:
+        if not self.snapshot.folded_names:
+            return super().suggest_names(name)
+        return self.suggest_names_by_prefix(name)
+
+    def item_at(self, position: int):
+        return contact_from_row(self.snapshot.contact(position), self)
+
+
+class MappedNoteBook(MappedBook, NoteBook):
+    def __init__(self, snapshot: MappedSnapshot):
+        super().__init__()
+        self.attach_snapshot(snapshot)
+        self.last_id = snapshot.last_id
+
+    def snapshot_count(self) -> int:
+        return self.snapshot.notes_count
+
+    def find_position(self, id) -> int | None:
+        return self.snapshot.find_note(id) if isinstance(id, int) else None
+
+    def key_at(self, position: int) -> int:
+        return self.snapshot.note_id(position)
+
+    def item_at(self, position: int):
+        return note_from_row(self.snapshot.note(position), self)
@@ -1,17 +1,41 @@
 from app import constant
-from collections import UserDict
+from app.util.index import KeyOrder
+from app.util.observable import ObservableDict
+from app.util.slots import Slotted
 from app.exceptions import ValidationException, DuplicateException, NotFoundException
+from app.fulltext import FullTextIndex
+from app.notes_index import TagIndex, match_tags
+from app.util.suggest import Suggester, did_you_mean
 
 
-class Field:
+class Field(Slotted):
+    __slots__ = ('_value',)
+
     def __init__(self, value):
         self.value = value
 
+    @classmethod
+    def restore(cls, value):
+        """Create field from a trusted stored value without validation"""
+        field = cls.__new__(cls)
+        field._value = value
+        return field
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, new_value):
+        self._value = new_value
+
     def __str__(self):
         return str(self.value)
 
 
 class Text(Field):
+    __slots__ = ()
+
     def __init__(self, value):
         super().__init__(value)
 
@@ -28,6 +52,8 @@ class Text(Field):
 
 
 class Tag(Field):
+    __slots__ = ()
+
     def __init__(self, value):
         super().__init__(value)
 
@@ -44,14 +70,22 @@ class Tag(Field):
         self._value = sanitized_value
 
 
-class Note:
+class Note(Slotted):
+    __slots__ = ('id', 'text', 'tags', 'book')
+
     def __init__(self, id):
         self.id = int(id)
         self.text = None
         self.tags = []
+        self.book = None
+
+    def _notify(self):
+        if self.book is not None:
+            self.book.notify(self.id, self)
 
     def add_text(self, textString):
         self.text = Text(textString)
+        self._notify()
 
     def get_trimmed_text(self, text, max_len=10):
         suffix = "..."
@@ -63,34 +97,97 @@ class Note:
             raise DuplicateException(f"Tag #{tag} already exists")
         new_tag = Tag(tag)
         self.tags.append(new_tag)
+        self._notify()
         return new_tag
 
     def delete_tag(self, tag):
         found_tag = self.find_tag(tag)
         if not found_tag:
             error_msg = f"Note {self.id} is not tagged with {tag}"
-            raise NotFoundException(error_msg)
+            suggestions = Suggester(t.value for t in self.tags).suggest(tag)
+            raise NotFoundException(did_you_mean(error_msg, suggestions))
         self.tags.remove(found_tag)
+        self._notify()
 
     def delete_all_tags(self):
         self.tags = []
+        self._notify()
 
     def find_tag(self, tag):
         return next((t for t in self.tags if t.value == tag), None)
 
     def has_tags(self, search_tags):
-        return any(search_tag in [tag.value for tag in self.tags] for search_tag in search_tags)
+        return not {tag.value for tag in self.tags}.isdisjoint(search_tags)
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'text': self.text.value if self.text else None,
+            'tags': [tag.value for tag in self.tags],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        note = cls(data['id'])
+        if data.get('text') is not None:
+            note.text = Text(data['text'])
+        note.tags = [Tag(tag) for tag in data.get('tags', [])]
+        return note
 
     def __str__(self):
         return f"ID: {self.id:^4} | Text: {self.text.value:<50} | Tags: {' '.join(f'#{t.value}' for t in self.tags)}"
 
 
-class NoteBook(UserDict):
+class NoteBook(ObservableDict):
+    index_classes = {'fulltext': FullTextIndex, 'tags': TagIndex, 'order': KeyOrder}
+    persistent_indexes = ('fulltext',)
+
+    def __init__(self, *args, **kwargs):
+        self.last_id = 0
+        super().__init__(*args, **kwargs)
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        if 'last_id' not in state:
+            self.last_id = max(self.data.keys(), default=0)
+
     def add_note(self):
         note = Note(self.next_id())
         self.data[note.id] = note
+        note.book = self
+        self.notify(note.id, note)
         return note
 
+    def apply_change(self, key, data: dict | None):
+        """Restore a journaled change without notifying listeners"""
+        if data is None:
+            self.data.pop(key, None)
+            self.update_indexes(key)
+            return
+        note = Note.from_dict(data)
+        note.book = self
+        self.data[note.id] = note
+        self.last_id = max(self.last_id, note.id)
+        self.update_indexes(note.id, note)
+
+    def add_notes(self, texts: list[str]) -> list[Note]:
+        """Create notes for all the texts, ids are allocated at once"""
+        return self.insert_notes([(Text(text), []) for text in texts])
+
+    def insert_notes(self, contents: list[tuple[Text, list[Tag]]]) -> list[Note]:
+        """Create notes of validated text and tags, ids are allocated and
+        listeners and indexes are notified once for all of them"""
+        notes = []
+        for id, (text, tags) in zip(self.allocate_ids(len(contents)), contents):
+            note = Note(id)
+            note.text = text
+            note.tags = tags
+            note.book = self
+            self.data[id] = note
+            notes.append(note)
+        self.notify_many((note.id, note) for note in notes)
+        return notes
+
     def find(self, id):
         try:
             return self.data[int(id)]
@@ -100,22 +197,33 @@ class NoteBook(UserDict):
             raise ValidationException(f"Note id must be integer")
 
     def search(self, search_strings: []):
-        result = []
-        for note in self.data.values():
-            if any(search_str in note.text.value for search_str in search_strings):
-                result.append(note)
-        return result
+        found_ids = self.index('fulltext').search(' '.join(search_strings))
+        return [self.data[id] for id in found_ids]
 
     def search_by_tags(self, search_tags: []):
-        return list(filter(lambda note: note.has_tags(search_tags), self.data.values()))
+        """Find notes by tags joined with OR, AND and NOT operators"""
+        index = self.index('tags')
+        found_ids = match_tags(search_tags, index.get, self.data.keys)
+        return [self.data[id] for id in sorted(found_ids)]
+
+    def tag_frequencies(self) -> dict[str, int]:
+        return self.index('tags').frequencies()
+
+    def suggest_tags(self, tag: str) -> list[str]:
+        return self.index('tags').suggester.suggest(tag)
 
     def delete_note(self, id):
         existing_note = self.find(id)
         if existing_note:
             self.data.pop(existing_note.id)
+            existing_note.book = None
+            self.notify(existing_note.id)
 
     def next_id(self):
-        if not self.data:
-            return 1
-        id = max([int(id) for id in self.data.keys()]) + 1
-        return id
+        return self.allocate_ids(1)[0]
+
+    def allocate_ids(self, count: int) -> range:
+        """Reserve ids for new notes, ids of deleted notes are never reused"""
+        ids = range(self.last_id + 1, self.last_id + count + 1)
+        self.last_id += count
+        return ids
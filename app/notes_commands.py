@@ -1,36 +1,46 @@
-from app.command_handler import command
+from app.command_handler import command, read_input
 from app.storage import storage
-from app.exceptions import BotSyntaxException
+from app.exceptions import BotSyntaxException, ValidationException
 from app.util.string_utils import get_divider
+from app.util.pagination import Page
+from app.util.transfer import transfer_args
+from app.util.suggest import did_you_mean
 
 
-@command(name='add-note')
+@command(name='add-note', transaction=False)
 def add_note(args):
     """Add note to the NoteBook
     usage:
-        add-note
+        add-note [text]
+    arguments:
+        text - note text, asked for when omitted (optional)
         """
     notes = storage.notes
-    note = notes.add_note()
-    text = input("Enter note text: ")
-    note.add_text(text)
+    text = ' '.join(args) if args else read_input("Enter note text: ")
+    with storage.write():
+        note, = notes.add_notes([text])
     return f"Note [{note.id}] created."
 
 
-@command(name='edit-note')
+@command(name='edit-note', transaction=False)
 def edit_note(args):
     """Edit existing note
        usage:
-           edit-note [note-id]
+           edit-note [note-id] [text]
        arguments:
            note-id - note identifier
+           text - new note text, asked for when omitted (optional)
            """
     notes = storage.notes
     if len(args) == 0:
         raise BotSyntaxException()
-    note = notes.find(args[0])
-    text = input("Enter new text: ")
-    note.add_text(text)
+    with storage.read():
+        note = notes.find(args[0])
+        version = notes.version(note.id)
+    text = ' '.join(args[1:]) if len(args) > 1 else read_input("Enter new text: ")
+    with storage.write():
+        notes.check_version(note.id, version)
+        note.add_text(text)
     return f"Note [{note.id}] updated."
 
 
@@ -50,17 +60,25 @@ def delete_note(args):
     return f"Note [{id}] deleted."
 
 
-@command(name='all-notes')
+@command(name='all-notes', read_only=True, cache=('notes',))
 def show_notes(args):
     """Show list of all notes
        usage:
-           all-notes
+           all-notes [--page N] [--size M] [--limit K] [--after note-id]
+       arguments:
+           --page - number of the page to show (optional)
+           --size - number of notes on a page, 20 by default (optional)
+           --limit - show at most K notes (optional)
+           --after - continue the listing after the note (optional)
            """
     notes = storage.notes
-    return get_divider().join([f"{note}" for note in notes.values()])
+    page = Page.from_args(args)
+    after = int(page.after) if page.after is not None else None
+    return page.render(notes.values_after(after), key=lambda note: note.id,
+                       command='all-notes', separator=get_divider())
 
 
-@command(name='note')
+@command(name='note', read_only=True)
 def get_note(args):
     """Show note
        usage:
@@ -75,14 +93,16 @@ def get_note(args):
     return f"id: {note.id}\ntext: {note.text}"
 
 
-@command(name='search-notes')
+@command(name='search-notes', read_only=True, cache=('notes',))
 def search_notes(args):
     """Search notes by text or tag
        usage:
            search-notes [-tag] [search-term]
        arguments:
            -tag - search by tag mode (optional)
-           search-term - text/tag to search
+           search-term - text/tag to search, words are joined by OR unless
+               AND stands between them, "quoted words" match a phrase,
+               NOT before a tag excludes notes with the tag
            """
     notes = storage.notes
     if not args:
@@ -92,12 +112,31 @@ def search_notes(args):
             raise BotSyntaxException()
         search_tags = [tag.lstrip('#') for tag in args[1:]]
         result = notes.search_by_tags(search_tags)
+        if not result:
+            frequencies = notes.tag_frequencies()
+            suggestions = [suggestion for tag in search_tags if tag not in ('AND', 'OR', 'NOT')
+                           and tag not in frequencies for suggestion in notes.suggest_tags(tag)]
+            return did_you_mean("Nothing found", suggestions)
     else:
         result = notes.search(args)
 
     return get_divider().join(str(note) for note in result) if result else "Nothing found"
 
 
+@command(name='tags', read_only=True)
+def show_tags(args):
+    """Show all tags with the number of tagged notes
+       usage:
+           tags
+           """
+    notes = storage.notes
+    frequencies = notes.tag_frequencies()
+    if not frequencies:
+        return "No tags yet"
+    ordered = sorted(frequencies.items(), key=lambda item: (-item[1], item[0]))
+    return '\n'.join(f"#{tag:<20} {count}" for tag, count in ordered)
+
+
 @command(name='tag-note')
 def add_note_tag(args):
     """Add tag to note
@@ -143,3 +182,41 @@ def delete_note_tag(args):
     saznitized_tag = tag.lstrip('#')
     note.delete_tag(saznitized_tag)
     return f"Tag #{saznitized_tag} deleted from note {note.id}"
+
+
+@command(name='import-notes', transaction=False)
+def import_notes(args):
+    """Import notes from JSONL, text or Markdown files
+    usage:
+        import-notes [path] [--format jsonl|text|markdown]
+    arguments:
+        path - JSONL file (.jsonl), text file with a note per line (.txt),
+               Markdown file (.md) or directory of Markdown files with a note per file
+        --format - format when the extension doesn't tell it (optional)
+    #hashtags of the note texts become note tags.
+    """
+    from app import notes_transfer
+    path, options = transfer_args(args, '--format')
+    try:
+        report = notes_transfer.import_notes(storage.notes, path, options.get('format'), transaction=storage.write)
+    except OSError as e:
+        raise ValidationException(f"Can't read {path}: {e.strerror}")
+    return str(report)
+
+
+@command(name='export-notes', read_only=True)
+def export_notes(args):
+    """Export all notes to JSONL, text or Markdown files
+    usage:
+        export-notes [path] [--format jsonl|text|markdown]
+    arguments:
+        path - file to write, or directory for a Markdown file per note
+        --format - format when the extension doesn't tell it (optional)
+    """
+    from app import notes_transfer
+    path, options = transfer_args(args, '--format')
+    try:
+        count = notes_transfer.export_notes(storage.notes, path, options.get('format'))
+    except OSError as e:
+        raise ValidationException(f"Can't write {path}: {e.strerror}")
+    return f"Exported {count} notes to {path}"
@@ -0,0 +1,75 @@
+from app.util.index import ReverseIndex
+from app.util.suggest import Suggester
+
+
+class TagIndex(ReverseIndex):
+    """Maps tags to the ids of notes tagged with them"""
+
+    def __init__(self):
+        super().__init__()
+        self.suggester = Suggester()
+
+    def rebuild(self, items: dict):
+        self.suggester = Suggester()
+        super().rebuild(items)
+
+    def term_added(self, term):
+        self.suggester.add(term)
+
+    def term_removed(self, term):
+        self.suggester.discard(term)
+
+    def source(self, note):
+        return tuple(tag.value for tag in note.tags)
+
+    def terms(self, source) -> set:
+        return set(source)
+
+    def frequencies(self) -> dict[str, int]:
+        return {tag: len(ids) for tag, ids in self.entries.items()}
+
+
+def parse_tag_query(tokens: list[str]) -> list[tuple[set, set]]:
+    """Parse tag query to OR-ed groups of (required tags, excluded tags)
+
+    Tags are joined by OR unless AND stands between them, NOT excludes
+    the following tag from the group.
+    """
+    groups = [(set(), set())]
+    join_next = False
+    exclude_next = False
+    for token in tokens:
+        if token == 'OR':
+            join_next = False
+        elif token == 'AND':
+            join_next = True
+        elif token == 'NOT':
+            exclude_next = True
+            join_next = True
+        else:
+            required, excluded = groups[-1]
+            if not join_next and (required or excluded):
+                groups.append((set(), set()))
+                required, excluded = groups[-1]
+            (excluded if exclude_next else required).add(token)
+            join_next = False
+            exclude_next = False
+    return [group for group in groups if group[0] or group[1]]
+
+
+def match_tags(tokens: list[str], lookup, all_ids) -> set:
+    """Evaluate tag query with set operations
+
+    lookup(tag) returns ids of notes with the tag, all_ids() returns ids
+    of all notes and is called only for groups without required tags.
+    """
+    found = set()
+    for required, excluded in parse_tag_query(tokens):
+        if required:
+            ids = set.intersection(*(set(lookup(tag)) for tag in required))
+        else:
+            ids = set(all_ids())
+        for tag in excluded:
+            ids -= lookup(tag)
+        found |= ids
+    return found
@@ -0,0 +1,154 @@
+import json
+import os
+import re
+import sys
+from app import constant
+from app.exceptions import ValidationException
+from app.notes import Note, NoteBook, Text, Tag
+from app.util.transfer import TransferReport, batched, guess_format, open_text
+
+FORMATS = {'.jsonl': 'jsonl', '.ndjson': 'jsonl', '.txt': 'text', '.md': 'markdown', '.markdown': 'markdown'}
+MARKDOWN_EXTENSIONS = ('.md', '.markdown', '.txt')
+HASHTAG = re.compile(r'(?<![\w#])#(\w[\w-]*)')
+
+
+def extract_tags(text: str) -> list[str]:
+    """#hashtags of the text long enough to be tags, in order of appearance"""
+    tags = dict.fromkeys(HASHTAG.findall(text))
+    return [tag for tag in tags if len(tag) >= constant.TAG_LEN]
+
+
+def text_with_tags(note: Note) -> str:
+    """Note text followed by the tags not mentioned in it as #hashtags"""
+    text = note.text.value if note.text else ''
+    mentioned = set(HASHTAG.findall(text))
+    missing = [f"#{tag.value}" for tag in note.tags if tag.value not in mentioned]
+    return ' '.join([text] + missing) if missing else text
+
+
+# Readers yield (location, {'text': ..., 'tags': [...]})
+
+def read_jsonl(path: str):
+    with open_text(path, 'r') as fh:
+        for line_number, line in enumerate(fh, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                data = {'error': "Invalid JSON"}
+            yield f"line {line_number}", data
+
+
+def read_text(path: str):
+    """One note per line"""
+    with open_text(path, 'r') as fh:
+        for line_number, line in enumerate(fh, 1):
+            if line.strip():
+                yield f"line {line_number}", {'text': line.strip()}
+
+
+def read_markdown(path: str):
+    """One note per file, a directory is walked for Markdown and text files"""
+    if not os.path.isdir(path):
+        with open_text(path, 'r') as fh:
+            yield path, {'text': fh.read().strip()}
+        return
+    for directory, subdirectories, files in os.walk(path):
+        subdirectories.sort()
+        for name in sorted(files):
+            if name.lower().endswith(MARKDOWN_EXTENSIONS):
+                file_path = os.path.join(directory, name)
+                with open_text(file_path, 'r') as fh:
+                    yield os.path.relpath(file_path, path), {'text': fh.read().strip()}
+
+
+# Writers stream notes of the book
+
+def write_jsonl(path: str, notes):
+    with open_text(path, 'w') as fh:
+        for note in notes:
+            fh.write(json.dumps(note.to_dict(), ensure_ascii=False) + '\n')
+
+
+def write_text(path: str, notes):
+    with open_text(path, 'w') as fh:
+        for note in notes:
+            fh.write(' '.join(text_with_tags(note).split()) + '\n')
+
+
+def write_markdown(path: str, notes):
+    """One <id>.md file per note in the directory"""
+    os.makedirs(path, exist_ok=True)
+    for note in notes:
+        with open_text(os.path.join(path, f"{note.id}.md"), 'w') as fh:
+            fh.write(text_with_tags(note) + '\n')
+
+
+READERS = {'jsonl': read_jsonl, 'text': read_text, 'markdown': read_markdown}
+WRITERS = {'jsonl': write_jsonl, 'text': write_text, 'markdown': write_markdown}
+
+
+def note_format(path: str, file_format: str = None) -> str:
+    if not file_format and os.path.isdir(path):
+        return 'markdown'
+    return guess_format(path, FORMATS, file_format)
+
+
+def validate_batch(batch: list[tuple[str, dict]]) -> list[tuple[str, tuple[Text, list[Tag]] | str]]:
+    """Text and tags of the notes, tags are the given ones and the #hashtags
+    of the text, invalid notes are replaced by the error message"""
+    validated = []
+    for location, data in batch:
+        try:
+            if data.get('error'):
+                raise ValidationException(data['error'])
+            text = Text(data.get('text') or '')
+            tags = {}
+            for value in list(data.get('tags') or []) + extract_tags(text.value):
+                tag = Tag(value)
+                tags.setdefault(tag.value, tag)
+            validated.append((location, (text, list(tags.values()))))
+        except (ValidationException, TypeError, AttributeError) as e:
+            validated.append((location, str(e) or type(e).__name__))
+    return validated
+
+
+def import_notes(book: NoteBook, path: str, file_format: str = None,
+                 transaction=None, progress=sys.stderr) -> TransferReport:
+    """Stream notes of the file or directory into the book
+
+    Every batch of notes gets its ids allocated and the indexes updated at
+    once, each batch in its own transaction.
+    """
+    reader = READERS[note_format(path, file_format)]
+    report = TransferReport('notes', progress)
+    for batch in map(validate_batch, batched(reader(path))):
+        contents = []
+        for location, result in batch:
+            if isinstance(result, str):
+                report.add_error(location, result)
+            else:
+                contents.append(result)
+        if transaction:
+            with transaction():
+                book.insert_notes(contents)
+        else:
+            book.insert_notes(contents)
+        report.added += len(contents)
+        report.count(len(batch))
+    return report
+
+
+def export_notes(book: NoteBook, path: str, file_format: str = None) -> int:
+    writer = WRITERS[note_format(path, file_format)]
+    exported = 0
+
+    def counted(notes):
+        nonlocal exported
+        for note in notes:
+            exported += 1
+            yield note
+
+    writer(path, counted(book.values()))
+    return exported
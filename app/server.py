@@ -0,0 +1,95 @@
+import asyncio
+import traceback
+from app.command_handler import execute_command, format_result, parse_input, set_interactive
+from app.exceptions import ExitProgram
+
+END_OF_RESPONSE = "."
+# longest command line read, the stream buffer of a client is bounded by it
+LINE_LIMIT = 2 ** 16
+
+
+def encode_response(text: str) -> bytes:
+    """Response lines followed by a line with a single dot, leading dots are doubled"""
+    lines = [('.' + line if line.startswith('.') else line) for line in text.split('\n')]
+    return ('\n'.join(lines) + '\n' + END_OF_RESPONSE + '\n').encode('utf-8')
+
+
+def run_command(command: str, args: list[str]) -> str:
+    return format_result(execute_command(command, args))
+
+
+class BotServer:
+    """Serves bot commands to many clients over TCP or a Unix socket
+
+    Every line received is a command, the response is terminated by a
+    line with a single dot. Blank lines and failed commands get an error
+    response, a line over LINE_LIMIT one too before the connection is
+    closed. Commands run
+    in worker threads, the storage transactions let read-only ones run
+    concurrently and the ones changing contacts or notes one at a time.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8765, unix_path: str = None):
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.sessions = 0
+
+    async def execute(self, command: str, args: list[str]) -> str:
+        return await asyncio.to_thread(run_command, command, args)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.sessions += 1
+        try:
+            writer.write(encode_response("Welcome to the C4 Assistant Bot! Type 'help' for reference."))
+            await writer.drain()
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # the rest of the line could not be told from the next command
+                    writer.write(encode_response(f"Commands longer than {LINE_LIMIT} bytes are not accepted."))
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                parsed = parse_input(line.decode('utf-8', errors='replace'))
+                if not isinstance(parsed, tuple):
+                    writer.write(encode_response(parsed))
+                    await writer.drain()
+                    continue
+                command, *args = parsed
+                try:
+                    response = await self.execute(command, args)
+                except ExitProgram as e:
+                    writer.write(encode_response(str(e)))
+                    await writer.drain()
+                    break
+                except Exception as e:
+                    # a failed command must not end the session of the client
+                    traceback.print_exc()
+                    response = f"Command failed: {str(e) or type(e).__name__}"
+                writer.write(encode_response(response))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+    async def serve(self):
+        set_interactive(False)
+        if self.unix_path:
+            server = await asyncio.start_unix_server(self.handle, path=self.unix_path, limit=LINE_LIMIT)
+        else:
+            server = await asyncio.start_server(self.handle, self.host, self.port, limit=LINE_LIMIT)
+        addresses = ', '.join(str(socket.getsockname()) for socket in server.sockets)
+        print(f"Serving on {addresses}")
+        async with server:
+            await server.serve_forever()
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,211 @@
+import gc
+import json
+import marshal
+import pickle
+import struct
+from contextlib import contextmanager
+from datetime import date
+from app.contacts import AddressBook, Record, Name, Birthday, Phone, Email, Address
+from app.notes import NoteBook, Note, Text, Tag
+
+MAGIC = b'C4SNAP'
+FORMAT_VERSION = 1
+CHUNK_SIZE = 1000
+PREAMBLE = struct.Struct('<6sHI')
+CHUNK = struct.Struct('<I')
+
+CONTACT_FIELDS = ('name', 'birthday', 'phones', 'email', 'address')
+NOTE_FIELDS = ('id', 'text', 'tags')
+
+MIGRATIONS = {}
+
+
+def migration(version: int):
+    """Register upgrade of the rows of a book from the format version to the next one
+
+    The function is called as migrate(book_name, header, rows) and returns
+    the upgraded rows, it may change the header of the book too.
+    """
+
+    def register(func):
+        MIGRATIONS[version] = func
+        return func
+
+    return register
+
+
+def contact_row(record: Record) -> tuple:
+    return (
+        record.name.value,
+        record.birthday.value.toordinal() if record.birthday else None,
+        tuple(phone.value for phone in record.phones),
+        record.email.value if record.email else None,
+        record.address.value if record.address else None,
+    )
+
+
+def contact_from_row(row: tuple, book: AddressBook) -> Record:
+    name, birthday, phones, email, address = row
+    return Record.restore(
+        Name.restore(name),
+        Birthday.restore(date.fromordinal(birthday)) if birthday is not None else None,
+        [Phone.restore(phone) for phone in phones],
+        Email.restore(email) if email is not None else None,
+        Address.restore(address) if address is not None else None,
+        book,
+    )
+
+
+def note_row(note: Note) -> tuple:
+    return (
+        note.id,
+        note.text.value if note.text else None,
+        tuple(tag.value for tag in note.tags),
+    )
+
+
+def note_from_row(row: tuple, book: NoteBook) -> Note:
+    id, text, tags = row
+    return Note.restore(
+        id,
+        Text.restore(text) if text is not None else None,
+        [Tag.restore(tag) for tag in tags],
+        book,
+    )
+
+
+BOOKS = {
+    'contacts': (CONTACT_FIELDS, contact_row, contact_from_row),
+    'notes': (NOTE_FIELDS, note_row, note_from_row),
+}
+
+
+def write_rows(fh, rows):
+    """Write rows in marshalled chunks, an empty chunk ends the sequence"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            write_chunk(fh, chunk)
+            chunk = []
+    if chunk:
+        write_chunk(fh, chunk)
+    fh.write(CHUNK.pack(0))
+
+
+def write_chunk(fh, value):
+    data = marshal.dumps(value)
+    fh.write(CHUNK.pack(len(data)))
+    fh.write(data)
+
+
+def read_chunks(fh):
+    while True:
+        value = read_chunk(fh)
+        if value is None:
+            return
+        yield value
+
+
+def read_chunk(fh):
+    size, = CHUNK.unpack(fh.read(CHUNK.size))
+    if not size:
+        return None
+    return marshal.loads(fh.read(size))
+
+
+@contextmanager
+def gc_paused():
+    """Millions of objects are created at once and none of them is garbage,
+    collecting them repeatedly while loading would only take time"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def dump(fh, book: AddressBook, notes: NoteBook):
+    """Write the books as a versioned snapshot
+
+    The header describes the row fields of every book, the rows follow
+    in chunks, so neither side holds the whole file in memory at once.
+    Values are encoded with marshal, which is fast but whose format may
+    change between Python versions: newer versions read the older formats,
+    not the other way round. The marshal version is kept in the header, so
+    a snapshot written by a newer Python is refused with a clear error.
+    """
+    header = {
+        'marshal': marshal.version,
+        'books': {
+            'contacts': {'fields': CONTACT_FIELDS},
+            'notes': {'fields': NOTE_FIELDS, 'last_id': notes.last_id},
+        },
+        'indexes': {'notes': list(notes.persistent_indexes)},
+    }
+    header_data = json.dumps(header).encode('utf-8')
+    fh.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_data)))
+    fh.write(header_data)
+    for name, observed in (('contacts', book), ('notes', notes)):
+        to_row = BOOKS[name][1]
+        write_rows(fh, (to_row(item) for item in observed.values()))
+    for name in notes.persistent_indexes:
+        write_chunk(fh, vars(notes.index(name)))
+
+
+def load(fh) -> tuple[AddressBook, NoteBook]:
+    """Read the snapshot written by dump(), older format versions are migrated
+
+    Files written before the format existed are plain pickles and are
+    loaded as such.
+    """
+    preamble = fh.read(PREAMBLE.size)
+    if len(preamble) < PREAMBLE.size or not preamble.startswith(MAGIC):
+        fh.seek(0)
+        with gc_paused():
+            return pickle.load(fh)
+    with gc_paused():
+        return load_books(fh, *PREAMBLE.unpack(preamble)[1:])
+
+
+def load_books(fh, version: int, header_size: int) -> tuple[AddressBook, NoteBook]:
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Storage format version {version} is newer than supported {FORMAT_VERSION}")
+    header = json.loads(fh.read(header_size).decode('utf-8'))
+    # snapshots written before the version was kept used the marshal version of this Python
+    if header.get('marshal', marshal.version) > marshal.version:
+        raise ValueError(f"Storage was written with marshal version {header['marshal']}, newer than supported "
+                         f"{marshal.version}, load it with a newer Python")
+
+    book = AddressBook()
+    notes = NoteBook()
+    for name, observed in (('contacts', book), ('notes', notes)):
+        book_header = header['books'][name]
+        fields, _, from_row = BOOKS[name]
+        for rows in read_chunks(fh):
+            for upgrade in range(version, FORMAT_VERSION):
+                rows = MIGRATIONS[upgrade](name, book_header, rows)
+            if tuple(book_header['fields']) != fields:
+                rows = reorder(rows, book_header['fields'], fields)
+            for row in rows:
+                item = from_row(row, observed)
+                observed.data[row[0]] = item
+    notes.last_id = header['books']['notes'].get('last_id') or max(notes.data, default=0)
+
+    for name in header['indexes']['notes']:
+        state = read_chunk(fh)
+        index_class = NoteBook.index_classes.get(name)
+        if index_class and state is not None:
+            index = index_class.__new__(index_class)
+            index.__dict__.update(state)
+            notes.restore_index(name, index)
+    return book, notes
+
+
+def reorder(rows, stored_fields, fields):
+    """Map rows to the current fields by name, fields missing in the file are None"""
+    positions = [stored_fields.index(field) if field in stored_fields else None for field in fields]
+    return [tuple(row[position] if position is not None else None for position in positions)
+            for row in rows]
@@ -0,0 +1,423 @@
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from datetime import date
+from app import constant
+from app.birthdays import get_celebrated_month_days
+from app.fulltext import parse_query
+from app.contacts import AddressBook, Record
+from app.contacts_index import name_key
+from app.exceptions import NotFoundException
+from app.notes import NoteBook, Note
+from app.notes_index import match_tags
+from app.util.suggest import Suggester
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    name TEXT PRIMARY KEY,
+    name_key TEXT,
+    birthday TEXT,
+    birth_month INTEGER,
+    birth_day INTEGER,
+    email TEXT,
+    address TEXT
+);
+CREATE INDEX IF NOT EXISTS contacts_email ON contacts (email);
+CREATE INDEX IF NOT EXISTS contacts_birthday ON contacts (birth_month, birth_day);
+CREATE TABLE IF NOT EXISTS phones (
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    phone TEXT NOT NULL,
+    PRIMARY KEY (name, position)
+);
+CREATE INDEX IF NOT EXISTS phones_phone ON phones (phone);
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    text TEXT
+);
+CREATE TABLE IF NOT EXISTS note_tags (
+    note_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (note_id, position)
+);
+CREATE INDEX IF NOT EXISTS note_tags_tag ON note_tags (tag);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+FULLTEXT_SCHEMA = """
+CREATE VIRTUAL TABLE notes_fulltext USING fts5 (text, tokenize = 'unicode61 remove_diacritics 0');
+INSERT INTO notes_fulltext (rowid, text) SELECT id, text FROM notes WHERE text IS NOT NULL;
+"""
+
+CONTACT_COLUMNS = """
+    c.name, c.birthday, c.email, c.address,
+    (SELECT json_group_array(phone)
+     FROM (SELECT phone FROM phones p WHERE p.name = c.name ORDER BY position))
+"""
+
+NOTE_COLUMNS = """
+    n.id, n.text,
+    (SELECT json_group_array(tag)
+     FROM (SELECT tag FROM note_tags t WHERE t.note_id = n.id ORDER BY position))
+"""
+
+
+def open_connection(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    # python lower() also folds non-ASCII letters, unlike the built-in one
+    connection.create_function("lower", 1, lambda s: s.lower() if s is not None else None,
+                               deterministic=True)
+    return connection
+
+
+def create_schema(connection: sqlite3.Connection):
+    connection.executescript(SCHEMA)
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(contacts)")}
+    if 'name_key' not in columns:
+        with connection:
+            connection.execute("ALTER TABLE contacts ADD COLUMN name_key TEXT")
+            connection.executemany("UPDATE contacts SET name_key = ? WHERE name = ?",
+                                   [(name_key(name), name) for name, in connection.execute(
+                                       "SELECT name FROM contacts").fetchall()])
+    connection.execute("CREATE INDEX IF NOT EXISTS contacts_name_key ON contacts (name_key)")
+    fulltext = connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'notes_fulltext'").fetchone()
+    if not fulltext:
+        with connection:
+            connection.executescript(FULLTEXT_SCHEMA)
+
+
+class ThreadConnections:
+    """Database connection of every thread
+
+    Cursors of one connection iterated by several threads at once reset
+    each other's statements, so each thread gets its own connection.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.local = threading.local()
+        self.opened = []
+        self.lock = threading.Lock()
+
+    def get(self) -> sqlite3.Connection:
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = open_connection(self.path)
+            self.local.connection = connection
+            with self.lock:
+                self.opened.append(connection)
+        return connection
+
+    def close(self):
+        with self.lock:
+            for connection in self.opened:
+                connection.close()
+            self.opened = []
+        self.local = threading.local()
+
+
+def to_fts5(node) -> str:
+    """Convert parsed search query to the FTS5 MATCH expression"""
+    kind, children = node
+    if kind == 'phrase':
+        return '"' + ' '.join(children) + '"'
+    return '(' + f' {kind.upper()} '.join(to_fts5(child) for child in children) + ')'
+
+
+class LazyMap(MutableMapping):
+    """Cache of book items in front of the database tables
+
+    Items are materialized on first access only and the cache keeps the
+    most recently used ones. Changes are written through by the book.
+    Concurrent readers share the cache, so it is guarded by its own lock.
+    """
+
+    def __init__(self, book, cache_size: int):
+        self.book = book
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+
+    def cached(self, key):
+        with self.lock:
+            item = self.cache.get(key)
+            if item is not None:
+                self.cache.move_to_end(key)
+            return item
+
+    def __getitem__(self, key):
+        item = self.cached(key)
+        if item is None:
+            item = next(self.book.load_where("WHERE {key} = ?", [key]), None)
+        if item is None:
+            raise KeyError(key)
+        return item
+
+    def __setitem__(self, key, item):
+        with self.lock:
+            self.cache[key] = item
+            self.cache.move_to_end(key)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def __delitem__(self, key):
+        self[key]
+        with self.lock:
+            self.cache.pop(key, None)
+
+    def __contains__(self, key):
+        return self.cached(key) is not None or self.book.has_key(key)
+
+    def __iter__(self):
+        return self.book.load_keys()
+
+    def __len__(self):
+        return self.book.count()
+
+    def values(self):
+        return self.book.load_where()
+
+
+class SqliteBook:
+    """Common SQL access of the SQLite backed books"""
+    table = None
+    alias = None
+    key_column = None
+    columns = None
+
+    def attach_database(self, connections: ThreadConnections):
+        self.connections = connections
+        self.data = LazyMap(self, constant.SQLITE_CACHE_SIZE)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        return self.connections.get()
+
+    def notify(self, key, item=None):
+        with self.connection:
+            self.write_item(key, item)
+        super().notify(key, item)
+
+    def notify_many(self, changes):
+        changes = list(changes)
+        with self.connection:
+            for key, item in changes:
+                self.write_item(key, item)
+        super().notify_many(changes)
+
+    def import_items(self, items):
+        with self.connection:
+            for item in items:
+                self.write_item(self.item_key(item), item)
+
+    def load_where(self, where: str = "", params=()):
+        sql = f"SELECT {self.columns} FROM {self.table} {self.alias} {where} ORDER BY {self.alias}.rowid"
+        sql = sql.format(key=f"{self.alias}.{self.key_column}")
+        for row in self.connection.execute(sql, params):
+            key = row[0]
+            cached = self.data.cached(key)
+            if cached is not None:
+                yield cached
+                continue
+            item = self.item_from_row(row)
+            item.book = self
+            self.data[key] = item
+            yield item
+
+    def values(self):
+        return self.data.values()
+
+    def values_after(self, key=None):
+        if key is None:
+            return self.load_where()
+        if not self.has_key(key):
+            raise NotFoundException(f"'{key}' is not found.")
+        return self.load_where(
+            f"WHERE {self.alias}.rowid > (SELECT rowid FROM {self.table} WHERE {self.key_column} = ?)", [key])
+
+    def load_keys(self):
+        sql = f"SELECT {self.key_column} FROM {self.table} ORDER BY rowid"
+        return (row[0] for row in self.connection.execute(sql))
+
+    def has_key(self, key) -> bool:
+        sql = f"SELECT 1 FROM {self.table} WHERE {self.key_column} = ?"
+        return self.connection.execute(sql, [key]).fetchone() is not None
+
+    def count(self) -> int:
+        return self.connection.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class SqliteAddressBook(SqliteBook, AddressBook):
+    table = "contacts"
+    alias = "c"
+    key_column = "name"
+    columns = CONTACT_COLUMNS
+
+    def __init__(self, connections: ThreadConnections):
+        super().__init__()
+        self.attach_database(connections)
+
+    @staticmethod
+    def item_key(record: Record):
+        return record.name.value
+
+    @staticmethod
+    def item_from_row(row) -> Record:
+        name, birthday, email, address, phones = row
+        return Record.from_dict({
+            'name': name,
+            'phones': json.loads(phones),
+            'birthday': birthday,
+            'email': email,
+            'address': address,
+        })
+
+    def write_item(self, name, record: Record | None):
+        self.connection.execute("DELETE FROM phones WHERE name = ?", [name])
+        if record is None:
+            self.connection.execute("DELETE FROM contacts WHERE name = ?", [name])
+            return
+        birthday = record.birthday.value if record.birthday else None
+        self.connection.execute(
+            """INSERT INTO contacts (name, name_key, birthday, birth_month, birth_day, email, address)
+               VALUES (?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (name) DO UPDATE SET
+                   birthday = excluded.birthday, birth_month = excluded.birth_month,
+                   birth_day = excluded.birth_day, email = excluded.email,
+                   address = excluded.address""",
+            [name, name_key(name), str(record.birthday) if birthday else None,
+             birthday.month if birthday else None, birthday.day if birthday else None,
+             record.email.value if record.email else None,
+             record.address.value if record.address else None])
+        self.connection.executemany(
+            "INSERT INTO phones (name, position, phone) VALUES (?, ?, ?)",
+            [(name, position, phone.value) for position, phone in enumerate(record.phones)])
+
+    def search(self, word: str):
+        word = word.lower()
+        return list(self.load_where(
+            """WHERE instr(lower(c.name), :word) OR instr(c.birthday, :word)
+                  OR instr(lower(c.email), :word) OR instr(lower(c.address), :word)
+                  OR c.name IN (SELECT name FROM phones WHERE instr(phone, :word))""",
+            {'word': word}))
+
+    def matching_names(self, name: str) -> list[str]:
+        return [row[0] for row in self.connection.execute(
+            "SELECT name FROM contacts WHERE name_key = ? ORDER BY name", [name_key(name)])]
+
+    def complete_name(self, prefix: str, limit: int) -> list[str]:
+        key = name_key(prefix)
+        return [row[0] for row in self.connection.execute(
+            """SELECT name FROM contacts WHERE name_key >= ? AND name_key < ?
+               ORDER BY name_key, name LIMIT ?""", [key, key + '\U0010ffff', limit])]
+
+    def suggest_names(self, name: str) -> list[str]:
+        return self.suggest_names_by_prefix(name)
+
+    def phone_owners(self, phone: str) -> list[str]:
+        return [row[0] for row in self.connection.execute(
+            "SELECT DISTINCT name FROM phones WHERE phone = ? ORDER BY name", [phone])]
+
+    def phones_starting_with(self, prefix: str, limit: int) -> tuple[dict[str, list[str]], int]:
+        # GLOB with a literal prefix is a range scan of the phones_phone index
+        pattern = prefix + '*'
+        owners = {}
+        for phone, name in self.connection.execute(
+                """SELECT phone, name FROM phones
+                   WHERE phone IN (SELECT DISTINCT phone FROM phones WHERE phone GLOB ? ORDER BY phone LIMIT ?)
+                   ORDER BY phone, name""", [pattern, limit]):
+            names = owners.setdefault(phone, [])
+            if name not in names:
+                names.append(name)
+        total = self.connection.execute(
+            "SELECT COUNT(DISTINCT phone) FROM phones WHERE phone GLOB ?", [pattern]).fetchone()[0]
+        return owners, total
+
+    def birthdays_on_day(self, day: date) -> list[Record]:
+        month_days = get_celebrated_month_days(day)
+        where = " OR ".join("(c.birth_month = ? AND c.birth_day = ?)" for _ in month_days)
+        params = [value for month_day in month_days for value in month_day]
+        return sorted(self.load_where(f"WHERE {where}", params), key=lambda record: record.name.value)
+
+    def birthdays_on_date(self, month: int, day: int) -> list[Record]:
+        records = self.load_where("WHERE c.birth_month = ? AND c.birth_day = ?", [month, day])
+        return sorted(records, key=lambda record: record.name.value)
+
+
+class SqliteNoteBook(SqliteBook, NoteBook):
+    table = "notes"
+    alias = "n"
+    key_column = "id"
+    columns = NOTE_COLUMNS
+
+    def __init__(self, connections: ThreadConnections):
+        super().__init__()
+        self.attach_database(connections)
+
+    @staticmethod
+    def item_key(note: Note):
+        return note.id
+
+    @staticmethod
+    def item_from_row(row) -> Note:
+        id, text, tags = row
+        return Note.from_dict({'id': id, 'text': text, 'tags': json.loads(tags)})
+
+    def write_item(self, id, note: Note | None):
+        self.connection.execute("DELETE FROM note_tags WHERE note_id = ?", [id])
+        self.connection.execute("DELETE FROM notes_fulltext WHERE rowid = ?", [id])
+        if note is None:
+            self.connection.execute("DELETE FROM notes WHERE id = ?", [id])
+            return
+        self.connection.execute(
+            "INSERT INTO notes (id, text) VALUES (?, ?) ON CONFLICT (id) DO UPDATE SET text = excluded.text",
+            [id, note.text.value if note.text else None])
+        if note.text:
+            self.connection.execute(
+                "INSERT INTO notes_fulltext (rowid, text) VALUES (?, ?)", [id, note.text.value])
+        self.connection.executemany(
+            "INSERT INTO note_tags (note_id, position, tag) VALUES (?, ?, ?)",
+            [(id, position, tag.value) for position, tag in enumerate(note.tags)])
+
+    def search(self, search_strings: []):
+        tree = parse_query(' '.join(search_strings))
+        if not tree[1]:
+            return []
+        ranked_ids = [row[0] for row in self.connection.execute(
+            "SELECT rowid FROM notes_fulltext WHERE notes_fulltext MATCH ? ORDER BY rank",
+            [to_fts5(tree)])]
+        return [self.data[id] for id in ranked_ids]
+
+    def search_by_tags(self, search_tags: []):
+        found_ids = match_tags(search_tags, self.tagged_ids, self.load_keys)
+        return [self.data[id] for id in sorted(found_ids)]
+
+    def tagged_ids(self, tag: str) -> set:
+        return {row[0] for row in self.connection.execute(
+            "SELECT note_id FROM note_tags WHERE tag = ?", [tag])}
+
+    def tag_frequencies(self) -> dict[str, int]:
+        return dict(self.connection.execute(
+            "SELECT tag, COUNT(DISTINCT note_id) FROM note_tags GROUP BY tag"))
+
+    def suggest_tags(self, tag: str) -> list[str]:
+        tags = (row[0] for row in self.connection.execute("SELECT DISTINCT tag FROM note_tags"))
+        return Suggester(tags).suggest(tag)
+
+    def allocate_ids(self, count: int) -> range:
+        with self.connection:
+            self.connection.execute(
+                """INSERT INTO counters (name, value) SELECT 'notes', COALESCE(MAX(id), 0) FROM notes
+                   WHERE true ON CONFLICT (name) DO NOTHING""")
+            self.connection.execute("UPDATE counters SET value = value + ? WHERE name = 'notes'", [count])
+            last_id = self.connection.execute("SELECT value FROM counters WHERE name = 'notes'").fetchone()[0]
+        return range(last_id - count + 1, last_id + 1)
@@ -1,17 +1,292 @@
-import pickle
+import os
+import threading
+from functools import partial
 from app import constant
-from app.util.data_generator import populateAddressBook, populateNotes
+from app import snapshot
 from app.contacts import AddressBook
 from app.notes import NoteBook
+from app.journal import Journal
+from app.util.metrics import metrics
+from app.util.rwlock import ReadWriteLock
 from pathlib import Path
 
 
+def fsync_directory(path: str):
+    """Make the rename of a file in the directory durable"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class PickleEngine:
+    """Keeps the whole state in one snapshot file rewritten on exit
+
+    The snapshot is written to a temporary file renamed over the old one,
+    so an interrupted save never leaves a truncated snapshot. The books are
+    saved in the background too when they changed (see Autosaver).
+    The snapshot is written in the marshal based format of app.snapshot,
+    the engine and its "pickle" name date from when it was a pickle,
+    such files are still loaded.
+    """
+    autosave = True
+
+    def __init__(self, storage_path: str, fsync: bool = constant.SNAPSHOT_FSYNC):
+        self.storage_path = storage_path
+        self.fsync = fsync
+
+    def load(self):
+        try:
+            with open(self.storage_path, "rb") as fh:
+                return snapshot.load(fh)
+        except FileNotFoundError:
+            return None, None
+
+    def open(self, book: AddressBook, notes: NoteBook):
+        return book, notes
+
+    def close(self, book: AddressBook, notes: NoteBook):
+        self.save(book, notes)
+
+    def dump_snapshot(self, fh, book: AddressBook, notes: NoteBook):
+        snapshot.dump(fh, book, notes)
+
+    def save(self, book: AddressBook, notes: NoteBook):
+        tmp_path = self.storage_path + ".tmp"
+        with open(tmp_path, "wb") as fh:
+            self.dump_snapshot(fh, book, notes)
+            if self.fsync:
+                fh.flush()
+                os.fsync(fh.fileno())
+        os.replace(tmp_path, self.storage_path)
+        if self.fsync:
+            fsync_directory(os.path.dirname(self.storage_path))
+
+
+class JournalEngine(PickleEngine):
+    """Snapshot plus append-only journal of changes
+
+    Every change of a contact or note costs one journal line. Once the
+    journal grows over the threshold it is merged into the snapshot by
+    a background thread, so nothing is rewritten on exit.
+    """
+    autosave = False
+
+    def __init__(self, storage_path: str, journal_path: str,
+                 compact_threshold: int = constant.JOURNAL_COMPACT_THRESHOLD):
+        super().__init__(storage_path)
+        self.journal = Journal(journal_path, fsync=constant.JOURNAL_FSYNC)
+        self.compact_threshold = compact_threshold
+        self.compactor = None
+        self.listeners = []
+
+    def load_snapshot(self):
+        return super().load()
+
+    def load(self):
+        book, notes = self.load_snapshot()
+        segments = self.journal.segments()
+        if segments:
+            book = book if isinstance(book, AddressBook) else AddressBook()
+            notes = notes if isinstance(notes, NoteBook) else NoteBook()
+            Journal.replay({'contacts': book, 'notes': notes}, segments)
+        return book, notes
+
+    def open(self, book: AddressBook, notes: NoteBook):
+        if not Path(self.storage_path).exists():
+            self.save(book, notes)
+        self.journal.open()
+        if self.journal.rotated_path.exists():
+            # left by a compaction interrupted by a crash, it would block the next ones
+            self.start_compactor()
+        for name, observed in (('contacts', book), ('notes', notes)):
+            listener = partial(self.record_changes, name)
+            observed.subscribe(listener, many=True)
+            self.listeners.append((observed, listener))
+        return book, notes
+
+    def close(self, book: AddressBook, notes: NoteBook):
+        for observed, listener in self.listeners:
+            observed.unsubscribe(listener)
+        self.listeners = []
+        self.journal.close()
+        if self.compactor:
+            self.compactor.join()
+            self.compactor = None
+
+    def record_changes(self, book_name: str, book, changes):
+        self.journal.append_many(book_name, changes)
+        if self.journal.size >= self.compact_threshold:
+            self.start_compaction()
+
+    def start_compaction(self):
+        if self.compactor and self.compactor.is_alive():
+            return
+        if self.journal.rotate():
+            self.start_compactor()
+
+    def start_compactor(self):
+        self.compactor = threading.Thread(target=self.compact, daemon=True)
+        self.compactor.start()
+
+    def compact(self):
+        """Merge the rotated journal segment into the snapshot
+
+        Works on its own copy of the state loaded from disk, so the books
+        used by the bot are never touched from the background thread.
+        """
+        book, notes = self.load_snapshot()
+        Journal.replay({'contacts': book, 'notes': notes}, [self.journal.rotated_path])
+        self.save(book, notes)
+        self.release(book, notes)
+        self.journal.rotated_path.unlink()
+
+    def release(self, book: AddressBook, notes: NoteBook):
+        """Free what the books loaded by load_snapshot() hold"""
+        pass
+
+
+class MappedEngine(JournalEngine):
+    """Memory-mapped snapshot plus journal of changes
+
+    The snapshot is read in place, so opening takes the same time for any
+    number of contacts and notes and only changed ones are kept in memory.
+    An existing snapshot storage is imported on the first start.
+    """
+
+    def __init__(self, mapped_path: str, journal_path: str, storage_path: str):
+        super().__init__(mapped_path, journal_path)
+        self.legacy = PickleEngine(storage_path)
+
+    def load_snapshot(self):
+        from app.mapped_storage import MappedAddressBook, MappedNoteBook, MappedSnapshot
+        if not Path(self.storage_path).exists():
+            return self.legacy.load()
+        mapped = MappedSnapshot(self.storage_path)
+        return MappedAddressBook(mapped), MappedNoteBook(mapped)
+
+    def dump_snapshot(self, fh, book: AddressBook, notes: NoteBook):
+        from app import mapped_storage
+        mapped_storage.dump(fh, book, notes)
+
+    def close(self, book: AddressBook, notes: NoteBook):
+        super().close(book, notes)
+        self.release(book, notes)
+
+    def release(self, book: AddressBook, notes: NoteBook):
+        snapshots = {getattr(loaded, 'snapshot', None) for loaded in (book, notes)}
+        for snapshot in snapshots - {None}:
+            snapshot.close()
+
+
+class SqliteEngine:
+    """Keeps contacts and notes in a SQLite database
+
+    Every change is written through to the database, contacts and notes
+    are materialized only when accessed. An existing snapshot storage is
+    imported on the first start.
+    """
+    autosave = False
+
+    def __init__(self, database_path: str, storage_path: str):
+        self.database_path = database_path
+        self.legacy = PickleEngine(storage_path)
+        self.connections = None
+
+    def load(self):
+        from app.sqlite_storage import SqliteAddressBook, SqliteNoteBook, ThreadConnections, create_schema
+        self.connections = ThreadConnections(self.database_path)
+        connection = self.connections.get()
+        create_schema(connection)
+        if connection.execute("PRAGMA user_version").fetchone()[0] == 0:
+            return self.legacy.load()
+        return SqliteAddressBook(self.connections), SqliteNoteBook(self.connections)
+
+    def open(self, book: AddressBook, notes: NoteBook):
+        from app.sqlite_storage import SqliteAddressBook, SqliteNoteBook
+        if not isinstance(book, SqliteAddressBook):
+            sqlite_book = SqliteAddressBook(self.connections)
+            sqlite_book.import_items(book.values())
+            book = sqlite_book
+        if not isinstance(notes, SqliteNoteBook):
+            sqlite_notes = SqliteNoteBook(self.connections)
+            sqlite_notes.import_items(notes.values())
+            notes = sqlite_notes
+        connection = self.connections.get()
+        with connection:
+            connection.execute("PRAGMA user_version = 1")
+        return book, notes
+
+    def close(self, book: AddressBook, notes: NoteBook):
+        self.connections.close()
+        self.connections = None
+
+
+class Autosaver(threading.Thread):
+    """Saves the storage in the background once contacts or notes changed
+
+    Changes are detected by the generations of the books, the snapshot is
+    written within a read transaction, so commands reading the books are
+    not blocked while it is written.
+    """
+
+    def __init__(self, storage, interval: float):
+        super().__init__(name="autosave", daemon=True)
+        self.storage = storage
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.saved = self.generations()
+
+    def generations(self) -> tuple[int, int]:
+        return self.storage.contacts.generation, self.storage.notes.generation
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.save()
+
+    def save(self):
+        with self.storage.read():
+            generations = self.generations()
+            if generations == self.saved:
+                return
+            self.storage.engine.save(self.storage.contacts, self.storage.notes)
+            self.saved = generations
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
 class DataStorage:
-    def __init__(self):
+    """Contacts and notes of the bot
+
+    Threads access the books in transactions: any number of them may
+    read at once within read(), changes are made within write() by one
+    thread at a time.
+    """
+
+    def __init__(self, engine: str = constant.STORAGE_ENGINE):
         self.storage_path = self.build_file_path()
+        self.engine = self.create_engine(engine)
+        self.lock = ReadWriteLock()
+        self.autosaver = None
         self.__book = None
         self.__notes = None
 
+    def read(self):
+        """Read transaction, the books don't change until it ends"""
+        metrics.count_transaction(read_only=True)
+        return self.lock.reading()
+
+    def write(self):
+        """Write transaction, nobody else reads or changes the books until it ends"""
+        metrics.count_transaction(read_only=False)
+        return self.lock.writing()
+
+    def transaction(self, read_only: bool = False):
+        return self.read() if read_only else self.write()
+
     @property
     def contacts(self) -> AddressBook:
         return self.__book
@@ -21,32 +296,58 @@ class DataStorage:
         return self.__notes
 
     @staticmethod
-    def build_file_path():
+    def build_file_path(file_name: str = constant.STORAGE_FILE_NAME):
         root_dir = Path.cwd() / constant.STORAGE_PATH
         if not root_dir.exists():
             root_dir.mkdir()
-        storage_file = root_dir / constant.STORAGE_FILE_NAME
+        storage_file = root_dir / file_name
         return str(storage_file)
 
+    def create_engine(self, name: str):
+        if name == "journal":
+            journal_path = self.build_file_path(constant.JOURNAL_FILE_NAME)
+            return JournalEngine(self.storage_path, journal_path)
+        if name == "pickle":
+            return PickleEngine(self.storage_path)
+        if name == "mmap":
+            mapped_path = self.build_file_path(constant.MAPPED_FILE_NAME)
+            journal_path = self.build_file_path(constant.JOURNAL_FILE_NAME)
+            return MappedEngine(mapped_path, journal_path, self.storage_path)
+        if name == "sqlite":
+            database_path = self.build_file_path(constant.SQLITE_FILE_NAME)
+            return SqliteEngine(database_path, self.storage_path)
+        raise ValueError(f"Unknown storage engine '{name}'")
+
     def __enter__(self) -> None:
-        try:
-            with open(self.storage_path, "rb") as fh:
-                self.__book, self.__notes = pickle.load(fh)
-        except FileNotFoundError:
-            pass
+        with self.write():
+            self.open()
+        if self.engine.autosave and constant.AUTOSAVE_INTERVAL:
+            self.autosaver = Autosaver(self, constant.AUTOSAVE_INTERVAL)
+            self.autosaver.start()
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        if self.autosaver:
+            self.autosaver.stop()
+            self.autosaver = None
+        with self.write():
+            self.engine.close(self.__book, self.__notes)
+            self.__book = None
+            self.__notes = None
 
+    def open(self):
+        self.__book, self.__notes = self.engine.load()
+
+        # Faker takes long to import, so the generator is imported only to populate empty storage
         if not isinstance(self.__book, AddressBook):
+            from app.util.data_generator import populateAddressBook
             self.__book = AddressBook()
             populateAddressBook(self.__book, 10)
         if not isinstance(self.__notes, NoteBook):
+            from app.util.data_generator import populateNotes
             self.__notes = NoteBook()
             populateNotes(self.__notes, 50)
 
-    def __exit__(self, exception_type, exception_value, traceback):
-        with open(self.storage_path, "wb+") as fh:
-            pickle.dump([self.__book, self.__notes], fh)
-        self.__book = None
-        self.__notes = None
+        self.__book, self.__notes = self.engine.open(self.__book, self.__notes)
 
 
 storage = DataStorage()
@@ -33,3 +33,4 @@ def populateNotes(notes: NoteBook, quantity):
         if note.id % 2:
             note.add_tag(fake.word(ext_word_list=valid_tags))
         notes.data[note.id] = note
+        note.book = notes
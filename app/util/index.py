@@ -0,0 +1,110 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+
+class ReverseIndex:
+    """Maps index terms to the set of keys of book items containing them
+
+    Only a compact source of every item is kept (see source()), the terms
+    are derived from it with terms(), so updating an item costs
+    proportionally to the item size and not to the book size.
+    """
+
+    def __init__(self):
+        self.entries = defaultdict(set)
+        self.sources = {}
+
+    def source(self, item):
+        raise NotImplementedError
+
+    def terms(self, source) -> set:
+        raise NotImplementedError
+
+    def rebuild(self, items: dict):
+        self.entries.clear()
+        self.sources.clear()
+        for key, item in items.items():
+            self.update(key, item)
+
+    def update(self, key, item=None):
+        new_source = self.source(item) if item is not None else None
+        old_source = self.sources.pop(key, None)
+        if new_source is not None:
+            self.sources[key] = new_source
+        if new_source == old_source:
+            return
+        old_terms = self.terms(old_source) if old_source is not None else set()
+        new_terms = self.terms(new_source) if new_source is not None else set()
+        for term in old_terms - new_terms:
+            keys = self.entries[term]
+            keys.discard(key)
+            if not keys:
+                del self.entries[term]
+                self.term_removed(term)
+        for term in new_terms - old_terms:
+            if term not in self.entries:
+                self.term_added(term)
+            self.entries[term].add(key)
+
+    def update_many(self, changes):
+        for key, item in changes:
+            self.update(key, item)
+
+    def term_added(self, term):
+        pass
+
+    def term_removed(self, term):
+        pass
+
+    def get(self, term) -> set:
+        return self.entries.get(term, set())
+
+
+class KeyOrder:
+    """Keys of the book in its insertion order, seekable by key
+
+    A dict keeps the order but can't seek to a key, so continuing a listing
+    after a key would scan all keys before it. Every key gets an increasing
+    number when inserted, so its position is found by bisection of the
+    numbers. A deleted key inserted again moves to the end, like in a dict.
+    """
+
+    def __init__(self):
+        self.numbers = {}
+        self.sequence = []
+        self.ordered_keys = []
+        self.next_number = 0
+
+    def rebuild(self, items: dict):
+        self.numbers.clear()
+        self.sequence.clear()
+        self.ordered_keys.clear()
+        for key in items:
+            self.append(key)
+
+    def append(self, key):
+        self.numbers[key] = self.next_number
+        self.sequence.append(self.next_number)
+        self.ordered_keys.append(key)
+        self.next_number += 1
+
+    def update(self, key, item=None):
+        if item is None:
+            number = self.numbers.pop(key, None)
+            if number is not None:
+                position = bisect_left(self.sequence, number)
+                del self.sequence[position]
+                del self.ordered_keys[position]
+        elif key not in self.numbers:
+            self.append(key)
+
+    def update_many(self, changes):
+        for key, item in changes:
+            self.update(key, item)
+
+    def keys_after(self, key):
+        """Keys following the key of the book"""
+        position = bisect_right(self.sequence, self.numbers[key])
+        while position < len(self.ordered_keys):
+            yield self.ordered_keys[position]
+            position += 1
@@ -0,0 +1,202 @@
+import json
+import threading
+import time
+import tracemalloc
+
+# Latency bucket bounds in seconds, growing by √2 from 10 µs to about 2 minutes
+LATENCY_BUCKETS = [1e-5 * 2 ** (i / 2) for i in range(48)]
+PROMETHEUS_BUCKETS = LATENCY_BUCKETS[::4]
+
+
+class CommandStats:
+    """Counters and latency histogram of one command"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.reads = 0
+        self.writes = 0
+        self.allocated = 0
+        self.max_allocated = 0
+
+    def record(self, elapsed: float, error: bool, reads: int, writes: int, allocated: int | None):
+        self.calls += 1
+        self.errors += error
+        self.total_time += elapsed
+        self.buckets[bucket_index(elapsed)] += 1
+        self.reads += reads
+        self.writes += writes
+        if allocated is not None:
+            self.allocated += allocated
+            self.max_allocated = max(self.max_allocated, allocated)
+
+    def percentile(self, share: float) -> float:
+        """Upper bound of the bucket holding the share of calls, in seconds"""
+        rank = share * self.calls
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else float('inf')
+        return 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'total_s': self.total_time,
+            'p50_ms': self.percentile(0.5) * 1000,
+            'p95_ms': self.percentile(0.95) * 1000,
+            'p99_ms': self.percentile(0.99) * 1000,
+            'storage_reads': self.reads,
+            'storage_writes': self.writes,
+            'allocated_bytes': self.allocated,
+            'max_allocated_bytes': self.max_allocated,
+        }
+
+
+def bucket_index(elapsed: float) -> int:
+    low, high = 0, len(LATENCY_BUCKETS)
+    while low < high:
+        middle = (low + high) // 2
+        if LATENCY_BUCKETS[middle] < elapsed:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+class Call:
+    """Measurement of one command execution"""
+
+    def __init__(self, registry, command: str):
+        self.registry = registry
+        self.command = command
+        self.reads = 0
+        self.writes = 0
+        self.previous = getattr(registry.current, 'call', None)
+        registry.current.call = self
+        self.allocated_before = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        self.started = time.perf_counter()
+        self.finished = False
+
+    def detach(self):
+        """Stop counting storage transactions of the thread for the call"""
+        self.registry.current.call = self.previous
+
+    def finish(self, error: bool = False):
+        if self.finished:
+            return
+        self.finished = True
+        elapsed = time.perf_counter() - self.started
+        allocated = None
+        if self.allocated_before is not None and tracemalloc.is_tracing():
+            allocated = tracemalloc.get_traced_memory()[0] - self.allocated_before
+        self.registry.record(self.command, elapsed, error, self.reads, self.writes, allocated)
+
+
+class Metrics:
+    """Per-command statistics of execute_command, shared by all threads
+
+    Allocations are measured only while tracemalloc is tracing, as the
+    net change of traced memory during the command. Storage transactions
+    are counted for the command running in the thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = threading.local()
+        self.commands = {}
+        self.started = time.time()
+
+    def start(self, command: str) -> Call:
+        return Call(self, command)
+
+    def record(self, command: str, elapsed: float, error: bool, reads: int, writes: int, allocated: int | None):
+        with self.lock:
+            stats = self.commands.get(command)
+            if stats is None:
+                stats = self.commands[command] = CommandStats()
+            stats.record(elapsed, error, reads, writes, allocated)
+
+    def count_transaction(self, read_only: bool):
+        call = getattr(self.current, 'call', None)
+        if call is None:
+            return
+        if read_only:
+            call.reads += 1
+        else:
+            call.writes += 1
+
+    def reset(self):
+        with self.lock:
+            self.commands = {}
+            self.started = time.time()
+
+    def snapshot(self) -> dict[str, dict]:
+        with self.lock:
+            return {command: stats.to_dict() for command, stats in sorted(self.commands.items())}
+
+    def to_json(self) -> str:
+        return json.dumps({'since': self.started, 'tracing_allocations': tracemalloc.is_tracing(),
+                           'commands': self.snapshot()}, indent=2)
+
+    def to_prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format"""
+        lines = [
+            "# HELP bot_command_seconds Latency of bot commands",
+            "# TYPE bot_command_seconds histogram",
+        ]
+        with self.lock:
+            commands = sorted(self.commands.items())
+            for command, stats in commands:
+                cumulative = 0
+                bucket = 0
+                for bound in PROMETHEUS_BUCKETS:
+                    while bucket < len(LATENCY_BUCKETS) and LATENCY_BUCKETS[bucket] <= bound:
+                        cumulative += stats.buckets[bucket]
+                        bucket += 1
+                    lines.append(f'bot_command_seconds_bucket{{command="{command}",le="{bound:.6g}"}} {cumulative}')
+                lines.append(f'bot_command_seconds_bucket{{command="{command}",le="+Inf"}} {stats.calls}')
+                lines.append(f'bot_command_seconds_sum{{command="{command}"}} {stats.total_time:.6f}')
+                lines.append(f'bot_command_seconds_count{{command="{command}"}} {stats.calls}')
+            for name, kind, help_text, attribute in (
+                    ('bot_command_errors_total', 'counter', "Failed bot commands", 'errors'),
+                    ('bot_command_storage_reads_total', 'counter', "Read transactions of commands", 'reads'),
+                    ('bot_command_storage_writes_total', 'counter', "Write transactions of commands", 'writes'),
+                    ('bot_command_allocated_bytes_total', 'counter',
+                     "Net memory allocated by commands while tracemalloc traced", 'allocated')):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for command, stats in commands:
+                    lines.append(f'{name}{{command="{command}"}} {getattr(stats, attribute)}')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path: str):
+        """Write the metrics as JSON, or in the Prometheus text format unless the path ends with .json"""
+        with open(path, 'w', encoding='utf-8') as fh:
+            fh.write(self.to_json() if path.endswith('.json') else self.to_prometheus())
+
+    def report(self) -> str:
+        rows = self.snapshot()
+        if not rows:
+            return "No commands executed yet"
+        tracing = tracemalloc.is_tracing()
+        header = f"{'command':<20} {'calls':>7} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} " \
+                 f"{'total s':>8} {'reads':>6} {'writes':>6}"
+        lines = [header + (f" {'alloc KiB':>10}" if tracing else '')]
+        for command, stats in rows.items():
+            line = (f"{command:<20} {stats['calls']:>7} {stats['errors']:>6} {stats['p50_ms']:9.3f} "
+                    f"{stats['p95_ms']:9.3f} {stats['p99_ms']:9.3f} {stats['total_s']:8.3f} "
+                    f"{stats['storage_reads']:>6} {stats['storage_writes']:>6}")
+            if tracing:
+                line += f" {stats['allocated_bytes'] / 1024:10.1f}"
+            lines.append(line)
+        if not tracing:
+            lines.append("Allocations are measured when started with --trace-allocations")
+        return '\n'.join(lines)
+
+
+metrics = Metrics()
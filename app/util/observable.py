@@ -0,0 +1,133 @@
+import threading
+from collections import UserDict
+from itertools import count
+from app.exceptions import ConflictException, NotFoundException
+
+INDEX_BUILD_LOCK = threading.Lock()
+# tokens of the books created in the process, never reused unlike id()
+BOOK_TOKENS = count()
+
+
+class ObservableDict(UserDict):
+    """UserDict which reports changes of its items to subscribed listeners
+
+    Listener is called as listener(book, key, item), item is None
+    when the key was removed from the book. Listeners subscribed with
+    many=True are called once per notify_many() as listener(book, changes)
+    with the list of (key, item) changes instead.
+
+    Indexes listed in index_classes are built on first use and kept up to
+    date on every change, only the ones in persistent_indexes are pickled.
+
+    Every change bumps the version of the key, so a change prepared from
+    an item read earlier can be checked against changes made meanwhile,
+    and the generation of the whole book, so its users can tell the book
+    changed. Both live only as long as the book is loaded, the token tells
+    the book apart from the other ones loaded in the process.
+    """
+    index_classes = {}
+    persistent_indexes = ()
+
+    def __init__(self, *args, **kwargs):
+        self._listeners = []
+        self._batch_listeners = []
+        self._indexes = {}
+        self._versions = {}
+        self.generation = 0
+        self.token = next(BOOK_TOKENS)
+        super().__init__(*args, **kwargs)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_listeners', None)
+        state.pop('_batch_listeners', None)
+        state.pop('_versions', None)
+        state.pop('generation', None)
+        state.pop('token', None)
+        state['_indexes'] = {name: index for name, index in self._indexes.items()
+                             if name in self.persistent_indexes}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._listeners = []
+        self._batch_listeners = []
+        self._versions = {}
+        self.generation = 0
+        self.token = next(BOOK_TOKENS)
+        self._indexes = state.get('_indexes', {})
+        for item in self.data.values():
+            item.book = self
+
+    def subscribe(self, listener, many: bool = False):
+        (self._batch_listeners if many else self._listeners).append(listener)
+
+    def unsubscribe(self, listener):
+        for listeners in (self._listeners, self._batch_listeners):
+            if listener in listeners:
+                listeners.remove(listener)
+
+    def version(self, key) -> int:
+        return self._versions.get(key, 0)
+
+    def check_version(self, key, version: int):
+        """Raise ConflictException if the item changed since the version was read"""
+        if self.version(key) != version:
+            raise ConflictException(f"'{key}' was changed meanwhile, try again.")
+
+    def notify(self, key, item=None):
+        self._versions[key] = self.version(key) + 1
+        self.update_indexes(key, item)
+        for listener in self._listeners:
+            listener(self, key, item)
+        for listener in self._batch_listeners:
+            listener(self, [(key, item)])
+
+    def notify_many(self, changes):
+        """Report many (key, item) changes at once"""
+        changes = list(changes)
+        for key, item in changes:
+            self._versions[key] = self.version(key) + 1
+        self.update_indexes_many(changes)
+        for listener in self._listeners:
+            for key, item in changes:
+                listener(self, key, item)
+        for listener in self._batch_listeners:
+            listener(self, changes)
+
+    def values_after(self, key=None):
+        """Iterate items following the key in the book order
+
+        The key is sought in the 'order' index of the book, so a listing
+        continued page by page doesn't scan the keys of the previous pages.
+        """
+        if key is None:
+            return iter(self.data.values())
+        if key not in self.data:
+            raise NotFoundException(f"'{key}' is not found.")
+        return (self.data[current] for current in self.index('order').keys_after(key))
+
+    def index(self, name: str):
+        """Return the named index of the book, building it on first use"""
+        if name not in self._indexes:
+            with INDEX_BUILD_LOCK:
+                if name not in self._indexes:
+                    index = self.index_classes[name]()
+                    index.rebuild(self.data)
+                    self._indexes[name] = index
+        return self._indexes[name]
+
+    def restore_index(self, name: str, index):
+        """Use the index loaded from storage instead of building it"""
+        self._indexes[name] = index
+
+    def update_indexes(self, key, item=None):
+        self.generation += 1
+        for index in self._indexes.values():
+            index.update(key, item)
+
+    def update_indexes_many(self, changes: list):
+        """Apply a batch of (key, item) changes to every index at once"""
+        self.generation += 1
+        for index in self._indexes.values():
+            index.update_many(changes)
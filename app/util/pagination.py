@@ -0,0 +1,63 @@
+from itertools import islice
+from app.exceptions import BotSyntaxException
+
+DEFAULT_PAGE_SIZE = 20
+
+
+class Page:
+    """Window over a listing requested with --page, --size, --limit and --after options
+
+    Without options the whole listing is streamed.
+    """
+
+    def __init__(self, number: int = None, size: int = None, limit: int = None, after: str = None):
+        self.number = number
+        self.size = size
+        self.limit = limit
+        self.after = after
+
+    @classmethod
+    def from_args(cls, args: list[str]):
+        options = {}
+        names = {'--page': 'number', '--size': 'size', '--limit': 'limit', '--after': 'after'}
+        tokens = iter(args)
+        for token in tokens:
+            name = names.get(token)
+            value = next(tokens, None)
+            if name is None or value is None:
+                raise BotSyntaxException()
+            if name != 'after':
+                if not value.isdigit() or int(value) < 1:
+                    raise BotSyntaxException()
+                value = int(value)
+            options[name] = value
+        return cls(**options)
+
+    @property
+    def start(self) -> int:
+        if self.number is None:
+            return 0
+        return (self.number - 1) * (self.size or DEFAULT_PAGE_SIZE)
+
+    @property
+    def count(self) -> int | None:
+        if self.limit is not None:
+            return self.limit
+        if self.number is not None or self.size is not None:
+            return self.size or DEFAULT_PAGE_SIZE
+        return None
+
+    def render(self, items, key, command: str, separator: str = ''):
+        """Lazily format the page items, str(item) is called only for yielded ones
+
+        A bounded page ends with the command continuing after its last item.
+        """
+        count = self.count
+        stop = None if count is None else self.start + count + 1
+        last = None
+        for position, item in enumerate(islice(items, self.start, stop)):
+            if position == count:
+                yield f"\nMore: {command} --after {key(last)} --size {count}"
+                return
+            yield (separator if position else '') + str(item)
+            last = item
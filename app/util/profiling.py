@@ -0,0 +1,99 @@
+import cProfile
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from app import constant
+
+REPORT_LIMIT = 25
+# the profile command profiles commands itself
+UNCAPTURED = {'profile'}
+slow_threshold_ms = None
+local = threading.local()
+
+
+def set_slow_threshold(threshold_ms: float | None):
+    """Profile every command and keep profiles of those slower than the threshold, None turns it off"""
+    global slow_threshold_ms
+    slow_threshold_ms = threshold_ms
+
+
+def profiles_path() -> Path:
+    return Path.cwd() / constant.STORAGE_PATH / constant.PROFILES_DIR
+
+
+def report(profile: cProfile.Profile, limit: int = REPORT_LIMIT) -> str:
+    """Functions of the profile taking the most time including their callees"""
+    import io
+    import pstats
+    stream = io.StringIO()
+    stats = pstats.Stats(profile, stream=stream)
+    stats.strip_dirs().sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue().strip()
+
+
+class CommandProfile:
+    """cProfile of one command execution, run() may be called again for every chunk of a lazy result
+
+    Only the time spent in the command counts for the slow threshold, not
+    the time the caller spends with the produced chunks.
+    """
+
+    def __init__(self, command: str, args: list[str]):
+        self.command = command
+        self.args = args
+        self.profile = cProfile.Profile()
+        self.elapsed = 0.0
+
+    def run(self, func, *args):
+        started = time.perf_counter()
+        if self.profile is not None:
+            try:
+                self.profile.enable()
+            except ValueError:
+                # another profiler is active, the command and its remaining chunks run unprofiled
+                self.profile = None
+        local.active = True
+        try:
+            return func(*args)
+        finally:
+            local.active = False
+            if self.profile is not None:
+                self.profile.disable()
+            self.elapsed += time.perf_counter() - started
+
+    def finish(self):
+        if slow_threshold_ms is None or self.profile is None or self.elapsed * 1000 < slow_threshold_ms:
+            return
+        path = self.save()
+        print(f"Slow command '{self.command}' took {self.elapsed * 1000:.0f} ms, profile saved to {path}",
+              file=sys.stderr)
+
+    def save(self) -> Path:
+        """Write the profile for pstats or snakeviz and a text report next to it"""
+        directory = profiles_path()
+        directory.mkdir(parents=True, exist_ok=True)
+        name = re.sub(r'[^\w-]', '_', self.command)
+        stem = f"{time.strftime('%Y%m%d-%H%M%S')}-{time.perf_counter_ns() % 10 ** 6:06}-{name}"
+        path = directory / f"{stem}.prof"
+        self.profile.dump_stats(path)
+        text = f"{self.command} {' '.join(self.args)}\n{self.elapsed * 1000:.1f} ms\n\n{report(self.profile)}\n"
+        (directory / f"{stem}.txt").write_text(text, encoding='utf-8')
+        prune(directory)
+        return path
+
+
+def prune(directory: Path):
+    """Keep only the latest constant.PROFILES_KEPT profiles"""
+    profiles = sorted(directory.glob('*.prof'), key=lambda path: path.stat().st_mtime)
+    for path in profiles[:-constant.PROFILES_KEPT]:
+        path.unlink(missing_ok=True)
+        path.with_suffix('.txt').unlink(missing_ok=True)
+
+
+def capture(command: str, args: list[str]) -> CommandProfile | None:
+    """Profile of the command when slow commands are captured and no profile runs in the thread"""
+    if slow_threshold_ms is None or command in UNCAPTURED or getattr(local, 'active', False):
+        return None
+    return CommandProfile(command, args)
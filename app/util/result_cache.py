@@ -0,0 +1,85 @@
+import sys
+import threading
+from collections import OrderedDict
+from app import constant
+
+
+class ResultCache:
+    """Least recently used command results, each valid as long as its stamp
+
+    The stamp tells the state of the data a result was computed from, a
+    result looked up with a different stamp is stale and dropped. Memory
+    is bounded by the total size of the cached strings, results larger
+    than a quarter of it are not cached.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def max_entry_bytes(self) -> int:
+        return self.max_bytes // 4
+
+    def get(self, key, stamp) -> str | None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self.remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, stamp, value: str):
+        size = sys.getsizeof(value)
+        if size > self.max_entry_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (stamp, value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def remove(self, key):
+        _, _, size = self.entries.pop(key)
+        self.size -= size
+
+    def collect(self, key, stamp, chunks):
+        """Yield the chunks of a lazy result and cache them joined once all were consumed"""
+        collected, size = [], 0
+        for chunk in chunks:
+            yield chunk
+            if collected is not None:
+                collected.append(chunk)
+                size += len(chunk)
+                if size > self.max_entry_bytes:
+                    collected = None
+        if collected is not None:
+            self.put(key, stamp, ''.join(collected))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def report(self) -> str:
+        with self.lock:
+            lookups = self.hits + self.misses
+            ratio = f" ({self.hits / lookups:.0%} hit)" if lookups else ''
+            return (f"Result cache: {self.hits} hits, {self.misses} misses{ratio}, {self.evictions} evictions, "
+                    f"{len(self.entries)} results in {self.size / 1024:.1f} of {self.max_bytes / 1024:.0f} KiB")
+
+
+result_cache = ResultCache(constant.RESULT_CACHE_BYTES)
@@ -0,0 +1,63 @@
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """Many reader threads or a single writer thread
+
+    Waiting writers block new readers, so a stream of reads can't starve
+    changes. Both locks may be entered again by the thread holding them,
+    the writer thread may read too, but readers can't upgrade to writing.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writer = None
+        self.writer_depth = 0
+        self.waiting_writers = 0
+        self.local = threading.local()
+
+    @contextmanager
+    def reading(self):
+        depth = getattr(self.local, 'depth', 0)
+        if depth or self.writer == threading.get_ident():
+            self.local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self.local.depth = depth
+            return
+        with self.condition:
+            self.condition.wait_for(lambda: self.writer is None and not self.waiting_writers)
+            self.readers += 1
+        self.local.depth = 1
+        try:
+            yield
+        finally:
+            self.local.depth = 0
+            with self.condition:
+                self.readers -= 1
+                if not self.readers:
+                    self.condition.notify_all()
+
+    @contextmanager
+    def writing(self):
+        me = threading.get_ident()
+        if getattr(self.local, 'depth', 0) and self.writer != me:
+            raise RuntimeError("Can't upgrade read lock to write lock")
+        with self.condition:
+            if self.writer != me:
+                self.waiting_writers += 1
+                self.condition.wait_for(lambda: self.writer is None and not self.readers)
+                self.waiting_writers -= 1
+                self.writer = me
+            self.writer_depth += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writer_depth -= 1
+                if not self.writer_depth:
+                    self.writer = None
+                    self.condition.notify_all()
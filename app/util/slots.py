@@ -0,0 +1,36 @@
+from functools import cache
+
+
+@cache
+def slot_names(cls) -> tuple[str, ...]:
+    return tuple(name for klass in reversed(cls.__mro__)
+                 for name in klass.__dict__.get('__slots__', ()))
+
+
+class Slotted:
+    """Compact pickling for classes with __slots__
+
+    The state is pickled as a plain list of slot values. Instances pickled
+    before the class got __slots__, with a __dict__ state, are restored too.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def restore(cls, *values):
+        """Create instance from trusted values of all slots in the slot order,
+        skipping __init__ and validation"""
+        instance = cls.__new__(cls)
+        for name, value in zip(slot_names(cls), values):
+            setattr(instance, name, value)
+        return instance
+
+    def __getstate__(self):
+        return [getattr(self, name, None) for name in slot_names(type(self))]
+
+    def __setstate__(self, state):
+        if isinstance(state, list):
+            state = zip(slot_names(type(self)), state)
+        else:
+            state = state.items()
+        for name, value in state:
+            setattr(self, name, value)
@@ -0,0 +1,69 @@
+import builtins
+import sys
+import time
+from contextlib import contextmanager
+
+REPORT_LIMIT = 15
+
+
+class StartupProfiler:
+    """Measures imports and startup phases until the first prompt
+
+    Imports are timed by wrapping builtins.__import__, so modules loaded
+    with importlib.import_module are counted in their importer only.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.imports = {}
+        self.phases = []
+        self.nested = []
+        self.original_import = None
+
+    def install(self):
+        self.original_import = builtins.__import__
+        builtins.__import__ = self.timed_import
+
+    def uninstall(self):
+        if self.original_import:
+            builtins.__import__ = self.original_import
+            self.original_import = None
+
+    def timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level == 0 and name in sys.modules:
+            return self.original_import(name, globals, locals, fromlist, level)
+        started = time.perf_counter()
+        self.nested.append(0.0)
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            nested = self.nested.pop()
+            if self.nested:
+                self.nested[-1] += elapsed
+            if level == 0:
+                total, own = self.imports.get(name, (0.0, 0.0))
+                self.imports[name] = (total + elapsed, own + elapsed - nested)
+
+    def mark(self, name: str):
+        """Record the time since the start as a phase"""
+        self.phases.append((name, time.perf_counter() - self.started))
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def report(self) -> str:
+        total = time.perf_counter() - self.started
+        lines = [f"Startup took {total * 1000:.1f} ms (interpreter start not included)"]
+        for name, elapsed in self.phases:
+            lines.append(f"  {name:<40} {elapsed * 1000:8.1f} ms")
+        lines.append(f"Slowest imports of {len(self.imports)} (cumulative / own ms):")
+        slowest = sorted(self.imports.items(), key=lambda item: -item[1][0])[:REPORT_LIMIT]
+        for name, (cumulative, own) in slowest:
+            lines.append(f"  {name:<40} {cumulative * 1000:8.1f} {own * 1000:8.1f}")
+        return '\n'.join(lines)
@@ -0,0 +1,171 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+PREFIX_LIMIT = 20
+GRAM_LEN = 3
+
+
+def edit_distance(str1: str, str2: str) -> int:
+    """Levenshtein distance counting swap of adjacent characters as one edit"""
+    previous, current = None, list(range(len(str2) + 1))
+    for i, char1 in enumerate(str1, 1):
+        before, previous, current = previous, current, [i] + [0] * len(str2)
+        for j, char2 in enumerate(str2, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char1 != char2))
+            if i > 1 and j > 1 and char1 == str2[j - 2] and str1[i - 2] == char2:
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[-1]
+
+
+def format_suggestions(words: list[str]) -> str:
+    return " or ".join(f"'{word}'" for word in words)
+
+
+def did_you_mean(message: str, words: list[str]) -> str:
+    if not words:
+        return message
+    return message + "\n    " + f"did you mean {format_suggestions(words)} ?"
+
+
+class Suggester:
+    """Ranked "did you mean" suggestions over a changing set of words
+
+    Words are indexed when added: sorted for prefix ranges, by sorted
+    characters for anagrams, by single character deletions for typos and
+    optionally by trigrams for substrings, so a suggestion costs the
+    number of candidates rather than the number of words.
+    """
+
+    def __init__(self, words=(), substrings: bool = True):
+        self.substrings = substrings
+        self.words = defaultdict(set)
+        self.sorted_keys = []
+        self.signatures = defaultdict(set)
+        self.deletes = defaultdict(set)
+        self.grams = defaultdict(set)
+        for word in words:
+            self.add(word)
+
+    @staticmethod
+    def normalize(word: str) -> str:
+        return word.casefold()
+
+    def rebuild(self, keys):
+        for index in (self.words, self.signatures, self.deletes, self.grams):
+            index.clear()
+        self.sorted_keys = []
+        for key in keys:
+            self.add(key)
+
+    def update(self, key, item=None):
+        if item is None:
+            self.discard(key)
+        else:
+            self.add(key)
+
+    def update_many(self, changes):
+        """update() of every change, words added by a batch without removals are sorted in at once"""
+        if any(item is None for _, item in changes):
+            for key, item in changes:
+                self.update(key, item)
+            return
+        added = [key for key in map(self.add_unsorted, (key for key, _ in changes)) if key]
+        if added:
+            self.sorted_keys.extend(added)
+            self.sorted_keys.sort()
+
+    def add(self, word: str):
+        key = self.add_unsorted(word)
+        if key:
+            insort(self.sorted_keys, key)
+
+    def add_unsorted(self, word: str) -> str | None:
+        """Index the word, return its key when it's new and missing in sorted_keys"""
+        key = self.normalize(word)
+        if not key:
+            return None
+        new = key not in self.words
+        if new:
+            for index, term in self.index_terms(key):
+                index[term].add(key)
+        self.words[key].add(word)
+        return key if new else None
+
+    def discard(self, word: str):
+        key = self.normalize(word)
+        originals = self.words.get(key)
+        if not originals:
+            return
+        originals.discard(word)
+        if originals:
+            return
+        del self.words[key]
+        del self.sorted_keys[bisect_left(self.sorted_keys, key)]
+        for index, term in self.index_terms(key):
+            index[term].discard(key)
+            if not index[term]:
+                del index[term]
+
+    def index_terms(self, key: str):
+        yield self.signatures, ''.join(sorted(key))
+        for term in self.deletions(key):
+            yield self.deletes, term
+        if self.substrings:
+            for gram in self.trigrams(key):
+                yield self.grams, gram
+
+    @staticmethod
+    def deletions(key: str) -> set:
+        return {key[:i] + key[i + 1:] for i in range(len(key))} | {key}
+
+    @staticmethod
+    def trigrams(key: str) -> set:
+        return {key[i:i + GRAM_LEN] for i in range(max(len(key) - GRAM_LEN + 1, 1))}
+
+    def candidates(self, query: str) -> set:
+        found = set(self.signatures.get(''.join(sorted(query)), ()))
+        position = bisect_left(self.sorted_keys, query)
+        for key in self.sorted_keys[position:position + PREFIX_LIMIT]:
+            if not key.startswith(query):
+                break
+            found.add(key)
+        found.update(query[:i] for i in range(1, len(query)) if query[:i] in self.words)
+        for term in self.deletions(query):
+            found.update(self.deletes.get(term, ()))
+        if self.substrings and len(query) >= GRAM_LEN:
+            grams = [self.grams.get(gram, set()) for gram in self.trigrams(query)]
+            found.update(set.intersection(*grams))
+        return found
+
+    @staticmethod
+    def score(query: str, key: str) -> int:
+        score = 0
+        if key.startswith(query) or query.startswith(key):
+            score += 5
+        elif edit_distance(query, key) <= 1:
+            score += 5
+
+        if score == 0 and (len(query) < len(key) / 3):
+            return score
+
+        if sorted(query) == sorted(key):
+            score += 3
+
+        if query in key or key in query:
+            score += 1
+
+        return score
+
+    def suggest(self, word: str, limit: int = 3) -> list[str]:
+        """Best scored words similar to the word"""
+        query = self.normalize(word)
+        if not query:
+            return []
+        scores = {key: self.score(query, key) for key in self.candidates(query)}
+        scores = {key: score for key, score in scores.items() if score > 0}
+        if not scores:
+            return []
+        best = max(scores.values())
+        keys = sorted((key for key, score in scores.items() if score == best),
+                      key=lambda key: (abs(len(key) - len(query)), key))
+        return [word for key in keys for word in sorted(self.words[key])][:limit]
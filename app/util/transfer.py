@@ -0,0 +1,117 @@
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+from app import constant
+from app.exceptions import BotSyntaxException, ValidationException
+
+BATCH_SIZE = 1000
+PROGRESS_INTERVAL = 100_000
+MAX_REPORTED_ERRORS = 10
+transfer_dir = None
+
+
+def default_transfer_dir() -> Path:
+    return Path.cwd() / constant.STORAGE_PATH / constant.TRANSFER_DIR
+
+
+def confine_transfers(directory: Path | None):
+    """Let import and export commands use files under the directory only, None allows any path"""
+    global transfer_dir
+    if directory is not None:
+        directory = Path(directory).resolve()
+        directory.mkdir(parents=True, exist_ok=True)
+    transfer_dir = directory
+
+
+def transfer_path(path: str) -> str:
+    """Path of the file to import or export, relative ones are taken in the transfer directory"""
+    if transfer_dir is None:
+        return path
+    resolved = (transfer_dir / path).resolve()
+    if not resolved.is_relative_to(transfer_dir):
+        raise ValidationException(f"Files are imported and exported in {transfer_dir} only")
+    return str(resolved)
+
+
+def guess_format(path: str, formats: dict[str, str], file_format: str = None) -> str:
+    """Format given by name or told by the extension of the path, formats map extensions to names"""
+    names = sorted(set(formats.values()))
+    if file_format:
+        if file_format not in names:
+            raise ValidationException(f"Unknown format '{file_format}', use {', '.join(names)}")
+        return file_format
+    for extension, name in formats.items():
+        if path.lower().endswith(extension):
+            return name
+    raise ValidationException("Can't tell the file format from the extension, use --format")
+
+
+def transfer_args(args: list[str], *options: str) -> tuple[str, dict[str, str]]:
+    """Path followed by pairs of the options and their values, as in import-contacts file --format csv"""
+    if not args:
+        raise BotSyntaxException()
+    path, values = transfer_path(args[0]), {}
+    tokens = iter(args[1:])
+    for token in tokens:
+        value = next(tokens, None)
+        if token not in options or value is None:
+            raise BotSyntaxException()
+        values[token.lstrip('-')] = value
+    return path, values
+
+
+def open_text(path: str, mode: str):
+    return open(path, mode, encoding='utf-8-sig' if mode == 'r' else 'utf-8', newline='')
+
+
+def batched(items, size: int = BATCH_SIZE):
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
+
+
+class TransferReport:
+    """Counts of an import, errors are kept as (location, message) for the first few only"""
+
+    def __init__(self, noun: str = 'records', progress=sys.stderr):
+        self.noun = noun
+        self.progress_output = progress
+        self.records = 0
+        self.added = 0
+        self.updated = 0
+        self.errors = 0
+        self.reported_errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self) -> float:
+        return self.records / self.elapsed if self.elapsed else 0.0
+
+    def add_error(self, location: str, message: str):
+        self.errors += 1
+        if len(self.reported_errors) < MAX_REPORTED_ERRORS:
+            self.reported_errors.append((location, message))
+
+    def count(self, records: int):
+        """Count processed records, progress is printed every PROGRESS_INTERVAL of them"""
+        previous = self.records
+        self.records += records
+        self.elapsed = time.perf_counter() - self.started
+        if self.progress_output and self.records // PROGRESS_INTERVAL > previous // PROGRESS_INTERVAL:
+            print(f"... {self.records} {self.noun} ({self.throughput:.0f} {self.noun}/sec)",
+                  file=self.progress_output)
+
+    def __str__(self):
+        counts = [f"{self.added} added"]
+        if self.updated:
+            counts.append(f"{self.updated} merged")
+        counts.append(f"{self.errors} errors")
+        lines = [f"Imported {self.records} {self.noun} in {self.elapsed:.2f} s "
+                 f"({self.throughput:.0f} {self.noun}/sec): {', '.join(counts)}"]
+        for location, message in self.reported_errors:
+            lines.append(f"  {location}: {message}")
+        if self.errors > len(self.reported_errors):
+            lines.append(f"  ... {self.errors - len(self.reported_errors)} more errors")
+        return '\n'.join(lines)
@@ -0,0 +1,60 @@
+"""Deterministic contacts and notes for benchmarks
+
+The same seed and count always give the same books, so results of
+different commits are measured on the same data.
+"""
+import random
+import string
+from app.contacts import AddressBook, Record, Phone, Birthday, Email, Address
+from app.notes import NoteBook, Text, Tag
+
+SYLLABLES = ['an', 'ba', 'da', 'el', 'ka', 'li', 'ma', 'na', 'ol', 'ra', 'sa', 'te', 'vi', 'yo', 'zu']
+STREETS = ['Baker Street', 'Main Street', 'Khreshchatyk', 'Park Avenue', 'Oak Lane', 'Shevchenka']
+TAGS = ['work', 'home', 'todo', 'idea', 'later', 'urgent', 'family', 'health', 'money', 'travel']
+
+
+def contact_names(count: int, seed: int = 1) -> list[str]:
+    """Unique pronounceable names, so searches and suggestions meet realistic words"""
+    rnd = random.Random(seed)
+    return [''.join(rnd.choices(SYLLABLES, k=rnd.randint(2, 4))).capitalize() + str(i) for i in range(count)]
+
+
+def generate_records(count: int, seed: int = 1) -> list[Record]:
+    rnd = random.Random(seed)
+    records = []
+    for i, name in enumerate(contact_names(count, seed)):
+        record = Record(name)
+        record.phones = [Phone(''.join(rnd.choices(string.digits, k=10))) for _ in range(rnd.randint(1, 2))]
+        if rnd.random() < 0.7:
+            record.birthday = Birthday(f"{rnd.randint(1, 28):02}.{rnd.randint(1, 12):02}.{rnd.randint(1950, 2005)}")
+        if rnd.random() < 0.5:
+            record.email = Email(f"{name.lower()}@mail.com")
+        if rnd.random() < 0.3:
+            record.address = Address(f"{rnd.randint(1, 999)} {rnd.choice(STREETS)}")
+        records.append(record)
+    return records
+
+
+def note_words(seed: int = 1) -> list[str]:
+    rnd = random.Random(seed)
+    return [''.join(rnd.choices(string.ascii_lowercase, k=rnd.randint(3, 9))) for _ in range(2000)]
+
+
+def generate_note_contents(count: int, seed: int = 1) -> list[tuple[Text, list[Tag]]]:
+    rnd = random.Random(seed)
+    words = note_words(seed)
+    return [(Text(' '.join(rnd.choices(words, k=rnd.randint(5, 15)))),
+             [Tag(tag) for tag in rnd.sample(TAGS, rnd.randint(0, 3))])
+            for _ in range(count)]
+
+
+def build_address_book(count: int, seed: int = 1) -> AddressBook:
+    book = AddressBook()
+    book.merge_records(generate_records(count, seed))
+    return book
+
+
+def build_notebook(count: int, seed: int = 1) -> NoteBook:
+    notes = NoteBook()
+    notes.insert_notes(generate_note_contents(count, seed))
+    return notes
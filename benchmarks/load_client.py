@@ -0,0 +1,85 @@
+"""Load generator for the bot server
+
+usage:
+    python main.py --serve 8765
+    python -m benchmarks.load_client [--port 8765] [--clients 20] [--requests 500] [--writes 0.2]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+READ_COMMANDS = [
+    "phone Load{n}",
+    "search-contacts oad{n}",
+    "all-notes --limit 10",
+    "birthdays",
+    "tags",
+]
+WRITE_COMMANDS = [
+    "add Load{n} {phone}",
+    "add-note load test note {n}",
+]
+
+
+async def read_response(reader: asyncio.StreamReader) -> str:
+    lines = []
+    while True:
+        line = (await reader.readline()).decode('utf-8')
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        line = line.rstrip('\n')
+        if line == '.':
+            return '\n'.join(lines)
+        lines.append(line[1:] if line.startswith('..') else line)
+
+
+async def connect(args):
+    if args.unix:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+
+async def run_client(client: int, args, latencies: list[float]):
+    rnd = random.Random(client)
+    reader, writer = await connect(args)
+    await read_response(reader)
+    for _ in range(args.requests):
+        templates = WRITE_COMMANDS if rnd.random() < args.writes else READ_COMMANDS
+        line = rnd.choice(templates).format(n=rnd.randrange(1000), phone=f"{rnd.randrange(10 ** 10):010}")
+        started = time.perf_counter()
+        writer.write((line + '\n').encode('utf-8'))
+        await writer.drain()
+        await read_response(reader)
+        latencies.append(time.perf_counter() - started)
+    writer.write(b"exit\n")
+    await writer.drain()
+    writer.close()
+
+
+async def run(args):
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(run_client(client, args, latencies) for client in range(args.clients)))
+    elapsed = time.perf_counter() - started
+    percentiles = statistics.quantiles(latencies, n=100)
+    print(f"{len(latencies)} requests from {args.clients} clients in {elapsed:.2f} s: "
+          f"{len(latencies) / elapsed:.0f} requests/sec")
+    print(f"latency ms: p50 {percentiles[49] * 1000:.2f}, p95 {percentiles[94] * 1000:.2f}, "
+          f"p99 {percentiles[98] * 1000:.2f}, max {max(latencies) * 1000:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure requests/sec and latency of the bot server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH', help="connect to the Unix socket instead")
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=500, help="requests per client")
+    parser.add_argument('--writes', type=float, default=0.2, help="share of changing commands")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
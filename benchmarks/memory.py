@@ -0,0 +1,70 @@
+"""Memory footprint of contacts and notes
+
+The objects of the books are measured against copies of them made of
+classes without __slots__, the baseline the slots are compared with.
+
+usage:
+    python -m benchmarks.memory [--count N]
+"""
+import argparse
+import gc
+import pickle
+import tracemalloc
+from functools import cache
+from app.util.slots import Slotted, slot_names
+from benchmarks.data import build_address_book, build_notebook
+
+
+@cache
+def unslotted_class(cls):
+    """Plain class with the name of the slotted one, its instances keep attributes in __dict__"""
+    return type(cls.__name__, (), {})
+
+
+def copy_objects(value, unslotted: bool):
+    """Copy of the slotted objects of the value sharing the other values with it"""
+    if isinstance(value, list):
+        return [copy_objects(item, unslotted) for item in value]
+    if not isinstance(value, Slotted):
+        return value
+    cls = type(value)
+    copy = object.__new__(unslotted_class(cls) if unslotted else cls)
+    for name in slot_names(cls):
+        if hasattr(value, name):
+            setattr(copy, name, copy_objects(getattr(value, name), unslotted))
+    return copy
+
+
+def traced(func, *args):
+    """Result of the call and the memory allocated by it"""
+    gc.collect()
+    tracemalloc.start()
+    result = func(*args)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, memory
+
+
+def measure(build, count: int) -> tuple[int, int, int]:
+    """Memory of the book, the same book without __slots__ and the pickle size"""
+    book, memory = traced(build, count)
+    items = list(book.data.values())
+    _, slotted = traced(copy_objects, items, False)
+    _, unslotted = traced(copy_objects, items, True)
+    return memory, memory - slotted + unslotted, len(pickle.dumps(book))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure memory used by contacts and notes")
+    parser.add_argument('--count', type=int, default=100_000)
+    args = parser.parse_args()
+    for name, build in (('contacts', build_address_book), ('notes', build_notebook)):
+        memory, baseline, pickle_size = measure(build, args.count)
+        print(f"{name:<10} {args.count} items: {memory / 2 ** 20:8.1f} MiB in memory "
+              f"({memory / args.count:6.0f} B/item), {pickle_size / 2 ** 20:8.1f} MiB pickled")
+        print(f"{'':<10} without __slots__: {baseline / 2 ** 20:8.1f} MiB in memory "
+              f"({baseline / args.count:6.0f} B/item), slots save {1 - memory / baseline:.0%}")
+
+
+if __name__ == "__main__":
+    main()
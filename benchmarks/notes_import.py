@@ -0,0 +1,78 @@
+"""Bulk import of notes against adding them one by one
+
+Generates a file of notes with #hashtags and imports it into a notebook
+with its full-text and tag indexes built, as the bot keeps them.
+
+usage:
+    python -m benchmarks.notes_import [--count 1000000] [--format jsonl] [--one-by-one]
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+from app.notes import NoteBook
+from app.notes_transfer import import_notes, read_jsonl, read_text, extract_tags
+
+WORDS = ['meeting', 'project', 'call', 'review', 'idea', 'shopping', 'travel', 'budget', 'report', 'plan',
+         'deadline', 'client', 'weekend', 'doctor', 'birthday', 'gift', 'book', 'movie', 'garden', 'repair']
+TAGS = ['work', 'home', 'todo', 'idea', 'later', 'urgent', 'family', 'health', 'money', 'fun']
+
+
+def generate(path: str, count: int, file_format: str, seed: int = 1):
+    rnd = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as fh:
+        for _ in range(count):
+            text = ' '.join(rnd.choices(WORDS, k=rnd.randint(3, 12)))
+            text += ' ' + ' '.join(f"#{tag}" for tag in rnd.sample(TAGS, rnd.randint(0, 3)))
+            fh.write((json.dumps({'text': text.strip()}) if file_format == 'jsonl' else text.strip()) + '\n')
+
+
+def new_notebook() -> NoteBook:
+    notes = NoteBook()
+    for name in notes.index_classes:
+        notes.index(name)
+    return notes
+
+
+def add_one_by_one(notes: NoteBook, path: str, file_format: str):
+    """The way add-note and tag-note build notes, every change notified on its own"""
+    reader = read_jsonl if file_format == 'jsonl' else read_text
+    for _, data in reader(path):
+        note = notes.add_note()
+        note.add_text(data['text'])
+        for tag in extract_tags(data['text']):
+            note.add_tag(tag)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure bulk import of notes")
+    parser.add_argument('--count', type=int, default=1_000_000)
+    parser.add_argument('--format', default='jsonl', choices=['jsonl', 'text'])
+    parser.add_argument('--one-by-one', action='store_true', help="add notes one by one instead of importing")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix='bot-notes-import-'),
+                        'notes.jsonl' if args.format == 'jsonl' else 'notes.txt')
+    generate(path, args.count, args.format)
+    notes = new_notebook()
+    started = time.perf_counter()
+    if args.one_by_one:
+        add_one_by_one(notes, path, args.format)
+    else:
+        report = import_notes(notes, path, progress=None)
+        if report.errors:
+            print(report)
+    elapsed = time.perf_counter() - started
+    os.remove(path)
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    tags = len(notes.tag_frequencies())
+    print(f"{len(notes)} notes with {tags} tags in {elapsed:.2f} s: "
+          f"{len(notes) / elapsed:.0f} notes/sec, peak memory {peak:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
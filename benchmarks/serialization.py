@@ -0,0 +1,62 @@
+"""Save and load time and file size of the snapshot format against pickle
+
+usage:
+    python -m benchmarks.serialization [--counts 10000 100000 1000000]
+"""
+import argparse
+import gc
+import os
+import pickle
+import tempfile
+import time
+from app import snapshot
+from benchmarks.data import build_address_book, build_notebook
+
+
+def save_pickle(fh, book, notes):
+    pickle.dump([book, notes], fh)
+
+
+def load_pickle(fh):
+    return pickle.load(fh)
+
+
+FORMATS = {
+    'pickle': (save_pickle, load_pickle),
+    'snapshot': (snapshot.dump, snapshot.load),
+}
+
+
+def timed(func, *args) -> float:
+    gc.collect()
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+def measure(path: str, save, load, book, notes) -> tuple[float, float, int]:
+    with open(path, 'wb') as fh:
+        save_time = timed(save, fh, book, notes)
+    with open(path, 'rb') as fh:
+        load_time = timed(load, fh)
+    return save_time, load_time, os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare snapshot and pickle storage formats")
+    parser.add_argument('--counts', type=int, nargs='+', default=[10_000, 100_000],
+                        help="numbers of contacts and of notes to store")
+    args = parser.parse_args()
+    path = os.path.join(tempfile.mkdtemp(prefix='bot-serialization-'), 'storage.bin')
+    print(f"{'records':>9} {'format':<9} {'save s':>8} {'load s':>8} {'size MiB':>9}")
+    for count in args.counts:
+        book, notes = build_address_book(count), build_notebook(count)
+        notes.index('fulltext')
+        for name, (save, load) in FORMATS.items():
+            save_time, load_time, size = measure(path, save, load, book, notes)
+            print(f"{count:>9} {name:<9} {save_time:8.2f} {load_time:8.2f} {size / 2 ** 20:9.1f}")
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Concurrent commands against the thread-safe storage
+
+Worker threads hammer add, add-note, tag-note and delete-note mixed with
+searches, then the indexes are checked against ones rebuilt from scratch
+and the storage is reopened and compared with the state in memory.
+
+usage:
+    python -m benchmarks.stress [--engine journal] [--threads 8] [--operations 2000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from app.command_handler import execute_command, format_result, load_commands, register_module
+from app.storage import storage
+
+TAGS = ['work', 'home', 'todo', 'idea', 'later']
+
+
+def random_command(rnd: random.Random) -> tuple[str, list[str]]:
+    note_id = str(rnd.randrange(1, 300))
+    choice = rnd.random()
+    if choice < 0.2:
+        return 'add', [f"Stress{rnd.randrange(200)}", f"{rnd.randrange(10 ** 10):010}"]
+    if choice < 0.35:
+        return 'add-note', ["stress", "note", str(rnd.randrange(1000))]
+    if choice < 0.55:
+        return 'tag-note', [note_id, rnd.choice(TAGS)]
+    if choice < 0.65:
+        return 'delete-note', [note_id]
+    if choice < 0.75:
+        return 'search-notes', ['#' + rnd.choice(TAGS)]
+    if choice < 0.85:
+        return 'search-contacts', [f"ress{rnd.randrange(20)}"]
+    if choice < 0.9:
+        return 'all-notes', ['--limit', '20']
+    if choice < 0.95:
+        return 'who-is', [f"{rnd.randrange(100):02}*"]
+    return 'birthdays', []
+
+
+def worker(seed: int, operations: int, failures: list):
+    rnd = random.Random(seed)
+    for _ in range(operations):
+        command, args = random_command(rnd)
+        try:
+            format_result(execute_command(command, args))
+        except Exception as e:
+            failures.append(f"{command} {' '.join(args)}: {e!r}")
+
+
+def index_state(index):
+    if hasattr(index, 'ordered_keys'):
+        return index.ordered_keys
+    if hasattr(index, 'sorted_terms'):
+        return dict(index.entries), index.sorted_terms
+    if hasattr(index, 'entries'):
+        return dict(index.entries)
+    if hasattr(index, 'postings'):
+        return index.postings, index.documents
+    return dict(index.words)
+
+
+def check_indexes(book) -> list[str]:
+    problems = []
+    for name in book.index_classes:
+        rebuilt = book.index_classes[name]()
+        rebuilt.rebuild(book.data)
+        if index_state(book.index(name)) != index_state(rebuilt):
+            problems.append(f"{type(book).__name__} index '{name}' differs from the rebuilt one")
+    return problems
+
+
+def snapshot(book) -> dict:
+    return {key: item.to_dict() for key, item in book.data.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run commands concurrently and check the storage consistency")
+    parser.add_argument('--engine', default='journal', choices=['journal', 'pickle', 'sqlite', 'mmap'])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--operations', type=int, default=2000, help="commands per thread")
+    args = parser.parse_args()
+
+    register_module('app.contacts_commands')
+    register_module('app.notes_commands')
+    load_commands()
+    os.chdir(tempfile.mkdtemp(prefix='bot-stress-'))
+    storage.storage_path = storage.build_file_path()
+    storage.engine = storage.create_engine(args.engine)
+
+    failures = []
+    with storage:
+        for book in (storage.contacts, storage.notes):
+            for name in book.index_classes:
+                book.index(name)
+        threads = [threading.Thread(target=worker, args=(seed, args.operations, failures))
+                   for seed in range(args.threads)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        problems = check_indexes(storage.contacts) + check_indexes(storage.notes)
+        expected = snapshot(storage.contacts), snapshot(storage.notes)
+    with storage:
+        if (snapshot(storage.contacts), snapshot(storage.notes)) != expected:
+            problems.append("Reopened storage differs from the state in memory")
+
+    total = args.threads * args.operations
+    print(f"{total} commands in {args.threads} threads in {elapsed:.2f} s: {total / elapsed:.0f} commands/sec")
+    for failure in failures[:20]:
+        print(failure)
+    for problem in problems:
+        print(problem)
+    print("FAILED" if failures or problems else "OK")
+    raise SystemExit(1 if failures or problems else 0)
+
+
+if __name__ == "__main__":
+    main()
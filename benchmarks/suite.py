@@ -0,0 +1,246 @@
+"""Time every bot command and the storage load and save on generated books
+
+Books of every size are generated with benchmarks.data, saved as a
+snapshot and opened with every engine, then each registered command is
+executed a few times with arguments picked from the books. Results are
+printed as a table and written as JSON, which may be compared with the
+results of another commit.
+
+usage:
+    python -m benchmarks.suite [--sizes 1000 10000] [--engines pickle] [--repeat 5]
+                               [--commands phone add ...] [--output results.json]
+                               [--compare old.json]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from app import constant, contacts_transfer, notes_transfer
+from app.command_handler import COMMANDS, execute_command, format_result, load_commands, \
+    register_module, set_interactive
+from app.contacts import AddressBook
+from app.storage import PickleEngine, storage
+from benchmarks.data import build_address_book, build_notebook, note_words
+
+ENGINES = ['journal', 'pickle', 'sqlite', 'mmap']
+SKIPPED = {'exit': "ends the session", 'close': "ends the session"}
+BULK_COMMANDS = {'import-contacts', 'export-contacts', 'import-notes', 'export-notes', 'all-contacts', 'all-notes'}
+IMPORT_COUNT = 1000
+
+
+class Fixture:
+    """Names, phones, note ids and files the command arguments are picked from"""
+
+    def __init__(self, book: AddressBook, seed: int, directory: str):
+        self.names = list(book.data)
+        self.phones = [record.phones[0].value for record in book.values()]
+        self.words = note_words(seed)
+        self.directory = directory
+        self.contacts_file = os.path.join(directory, 'import.csv')
+        self.notes_file = os.path.join(directory, 'import.jsonl')
+        contacts_transfer.export_contacts(build_address_book(IMPORT_COUNT, seed + 1), self.contacts_file)
+        notes_transfer.export_notes(build_notebook(IMPORT_COUNT, seed + 1), self.notes_file)
+
+    def name(self, i: int) -> str:
+        return self.names[i % len(self.names)]
+
+    def phone(self, i: int) -> str:
+        return self.phones[i % len(self.phones)]
+
+    def note_id(self, i: int) -> str:
+        return str(i % len(self.names) + 1)
+
+    def last_name(self, i: int) -> str:
+        """Names deleted by del-contact, taken from the end not to collide with the other cases"""
+        return self.names[-1 - i % len(self.names)]
+
+    def last_note_id(self, i: int) -> str:
+        return str(len(self.names) - i % len(self.names))
+
+
+CASES = {
+    'hello': lambda f, i: [],
+    'help': lambda f, i: [],
+    'add': lambda f, i: [f"Bench{i}", f"{i:010}"],
+    'change-phone': lambda f, i: [f.name(i), f.phone(i), f"{i + 1:010}"],
+    'phone': lambda f, i: [f.name(i * 7)],
+    'who-is': lambda f, i: [f.phone(i * 7) if i % 2 else f.phone(i * 7)[:3] + '*'],
+    'add-birthday': lambda f, i: [f.name(i), "01.01.1990"],
+    'show-birthday': lambda f, i: [f.name(i * 7)],
+    'all-contacts': lambda f, i: [],
+    'del-contact': lambda f, i: [f.last_name(i)],
+    'search-contacts': lambda f, i: [f.name(i * 7)[1:5].lower()],
+    'birthdays': lambda f, i: [],
+    'birthdays-in-days': lambda f, i: [str(i % 30)],
+    'birthdays-by-date': lambda f, i: [f"{i % 28 + 1:02}.{i % 12 + 1:02}"],
+    'add-email': lambda f, i: [f.name(i), f"bench{i}@mail.com"],
+    'add-ad': lambda f, i: [f.name(i), "1", "Bench", "Street"],
+    'import-contacts': lambda f, i: [f.contacts_file],
+    'export-contacts': lambda f, i: [os.path.join(f.directory, 'export.jsonl')],
+    'add-note': lambda f, i: ["benchmark", "note", str(i)],
+    'edit-note': lambda f, i: [f.note_id(i), "edited", "benchmark", "note"],
+    'delete-note': lambda f, i: [f.last_note_id(i)],
+    'all-notes': lambda f, i: [],
+    'note': lambda f, i: [f.note_id(i * 7)],
+    'search-notes': lambda f, i: [f.words[i % len(f.words)]],
+    'tags': lambda f, i: [],
+    'tag-note': lambda f, i: [f.note_id(i), f"bench{i}"],
+    'untag-note': lambda f, i: [f.note_id(i), "-all"],
+    'import-notes': lambda f, i: [f.notes_file],
+    'export-notes': lambda f, i: [os.path.join(f.directory, 'export-notes.jsonl')],
+    'stats': lambda f, i: [],
+    'profile': lambda f, i: ['phone', f.name(i * 7)],
+}
+
+
+def timings(values: list[float]) -> dict:
+    return {
+        'repeat': len(values),
+        'min_ms': min(values) * 1000,
+        'median_ms': statistics.median(values) * 1000,
+        'mean_ms': statistics.fmean(values) * 1000,
+    }
+
+
+def timed(func, *args) -> float:
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+def run_command(name: str, args: list[str]) -> bool:
+    """Execute the command and consume its lazy result, True when it failed"""
+    result = execute_command(name, args)
+    format_result(result)
+    return isinstance(result, Exception)
+
+
+def bench_commands(fixture: Fixture, repeat: int, names: list[str]) -> list[dict]:
+    results = []
+    for name in names:
+        case = CASES.get(name)
+        if name in SKIPPED or case is None:
+            results.append({'name': f"command:{name}", 'skipped': SKIPPED.get(name, "no benchmark case")})
+            continue
+        values, errors = [], 0
+        for i in range(1 if name in BULK_COMMANDS and repeat > 1 else repeat):
+            args = case(fixture, i)
+            started = time.perf_counter()
+            errors += run_command(name, args)
+            values.append(time.perf_counter() - started)
+        results.append({'name': f"command:{name}", 'errors': errors, **timings(values)})
+    return results
+
+
+def bench_engine(engine: str, snapshot_path: str, fixture: Fixture, repeat: int, names: list[str]) -> list[dict]:
+    """Open the engine on a copy of the snapshot, time commands, load and save
+
+    The first open converts the snapshot into the engine files, the load
+    is timed on the next open.
+    """
+    directory = tempfile.mkdtemp(prefix=f'bot-suite-{engine}-', dir=fixture.directory)
+    os.chdir(directory)
+    storage.storage_path = storage.build_file_path()
+    shutil.copy(snapshot_path, storage.storage_path)
+    storage.engine = storage.create_engine(engine)
+    convert = timed(storage.__enter__)
+    storage.__exit__(None, None, None)
+
+    load = timed(storage.__enter__)
+    results = bench_commands(fixture, repeat, names)
+    save = timed(storage.__exit__, None, None, None)
+    results[:0] = [
+        {'name': 'storage:convert', **timings([convert])},
+        {'name': 'storage:load', **timings([load])},
+        {'name': 'storage:save', **timings([save])},
+    ]
+    os.chdir(fixture.directory)
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_results(results: list[dict], previous: dict):
+    print(f"{'engine':<8} {'size':>8} {'benchmark':<26} {'median ms':>10} {'min ms':>10} {'errors':>6} {'vs old':>7}")
+    for result in results:
+        key = (result['engine'], result['size'], result['name'])
+        if 'skipped' in result:
+            print(f"{key[0]:<8} {key[1]:>8} {key[2]:<26} skipped: {result['skipped']}")
+            continue
+        old = previous.get(key)
+        change = f"{result['median_ms'] / old['median_ms']:6.2f}x" if old and old.get('median_ms') else ''
+        print(f"{key[0]:<8} {key[1]:>8} {key[2]:<26} {result['median_ms']:10.2f} {result['min_ms']:10.2f} "
+              f"{result.get('errors', 0):>6} {change:>7}")
+
+
+def load_previous(path: str | None) -> dict:
+    if not path:
+        return {}
+    with open(path, encoding='utf-8') as fh:
+        return {(result['engine'], result['size'], result['name']): result
+                for result in json.load(fh)['results']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time every command and the storage on generated books")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10_000],
+                        help="numbers of contacts and of notes in the books")
+    parser.add_argument('--engines', nargs='+', default=['pickle'], choices=ENGINES)
+    parser.add_argument('--commands', nargs='+', help="commands to time, all registered ones by default")
+    parser.add_argument('--repeat', type=int, default=5, help="executions of every command")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="file to write the JSON results to")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    register_module('app.contacts_commands')
+    register_module('app.notes_commands')
+    load_commands()
+    names = args.commands or list(COMMANDS)
+    previous = load_previous(args.compare)
+    set_interactive(False)
+    constant.AUTOSAVE_INTERVAL = 0
+
+    results = []
+    root = tempfile.mkdtemp(prefix='bot-suite-')
+    try:
+        for size in args.sizes:
+            book = build_address_book(size, args.seed)
+            fixture = Fixture(book, args.seed, root)
+            snapshot_path = os.path.join(root, f'storage-{size}.bin')
+            PickleEngine(snapshot_path, fsync=False).save(book, build_notebook(size, args.seed))
+            del book
+            for engine in args.engines:
+                for result in bench_engine(engine, snapshot_path, fixture, args.repeat, names):
+                    results.append({'engine': engine, 'size': size, **result})
+    finally:
+        os.chdir(os.path.dirname(root))
+        shutil.rmtree(root)
+
+    print_results(results, previous)
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
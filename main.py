@@ -1,46 +1,144 @@
+import sys
+from app.util.startup import StartupProfiler
+
+profiler = StartupProfiler()
+if '--profile-startup' in sys.argv:
+    profiler.install()
+
+import argparse
+import threading
+from contextlib import ExitStack
+from pathlib import Path
+from app import constant
 from app.storage import storage
 from app.exceptions import ExitProgram
-from app.command_handler import execute_command
-from importlib import import_module
-import_module('.contacts_commands', 'app')
-import_module('.notes_commands', 'app')
+from app.command_handler import execute_command, parse_input, print_result, register_module
 
+register_module('app.contacts_commands')
+register_module('app.notes_commands')
 
-def parse_input(user_input):
-    try:
-        cmd, *args = user_input.split()
-    except:
-        return "Invalid command."
-    cmd = cmd.strip().lower()
-    return cmd, *args
+WELCOME_PATH = Path(__file__).parent / "app" / "data" / "welcome.txt"
+WELCOME_TIMEOUT = 0.1
 
 
 def start_bot():
-    print_welcome()
+    from app.completion import install
+    install()
     while True:
         user_input = input("Enter a command: ")
         command, *args = parse_input(user_input)
 
         try:
-            print(execute_command(command, args))
+            print_result(execute_command(command, args))
         except ExitProgram as e:
             print(str(e))
             break
 
 
-def print_welcome():
-    try:
-        with open("app/data/welcome.txt", 'r') as f:
-            print(f.read())
-    except:
-        pass
-    finally:
-        print("Welcome to the C4 Assistant Bot! Type 'help' for reference.")
+def start_batch(file_name, quiet):
+    from app.batch import run_batch
+    if file_name and file_name != '-':
+        with open(file_name, 'r', encoding='utf-8') as fh:
+            report = run_batch(fh, quiet=quiet)
+    else:
+        report = run_batch(sys.stdin, quiet=quiet)
+    print(report, file=sys.stderr)
+
+
+class WelcomeReader(threading.Thread):
+    """Reads the welcome banner while the storage is loading"""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.text = None
+
+    def run(self):
+        try:
+            self.text = WELCOME_PATH.read_text()
+        except OSError:
+            pass
+
+
+def print_welcome(welcome: WelcomeReader):
+    welcome.join(WELCOME_TIMEOUT)
+    if welcome.text:
+        print(welcome.text)
+    print("Welcome to the C4 Assistant Bot! Type 'help' for reference.")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="C4 Assistant Bot")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="execute commands from the file ('-' for stdin) and exit")
+    parser.add_argument('--quiet', action='store_true', help="don't print results in batch mode")
+    parser.add_argument('--serve', metavar='[HOST:]PORT',
+                        help="serve commands to many clients over TCP")
+    parser.add_argument('--socket', metavar='PATH', help="serve commands over the Unix socket")
+    parser.add_argument('--transfer-dir', metavar='DIR',
+                        help="directory the import and export commands of server clients use, "
+                             "var/transfer by default")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="print time spent in imports and startup phases before the first prompt")
+    parser.add_argument('--metrics-file', metavar='PATH',
+                        help="write command statistics on exit, as JSON if PATH ends with .json, "
+                             "in the Prometheus text format otherwise")
+    parser.add_argument('--profile', metavar='MS', nargs='?', type=float, const=constant.SLOW_COMMAND_MS,
+                        help="profile commands and save profiles of those slower than MS milliseconds "
+                             f"(default {constant.SLOW_COMMAND_MS}) to var/profiles")
+    parser.add_argument('--unique-phones', action='store_true',
+                        help="refuse to give a contact a phone another contact already has")
+    parser.add_argument('--trace-allocations', action='store_true',
+                        help="measure memory allocated by commands with tracemalloc, slows commands down")
+    return parser.parse_args()
+
+
+def start_server(address, unix_path, transfer_dir):
+    from app.server import BotServer
+    from app.util.transfer import confine_transfers, default_transfer_dir
+    # clients must not read or overwrite any file the bot can reach
+    confine_transfers(transfer_dir or default_transfer_dir())
+    if unix_path:
+        server = BotServer(unix_path=unix_path)
+    else:
+        host, _, port = address.rpartition(':')
+        server = BotServer(host or '127.0.0.1', int(port))
+    server.run()
 
 
 def main():
-    with storage:
-        start_bot()
+    args = parse_args()
+    batch = args.batch or (None if sys.stdin.isatty() or args.serve or args.socket else '-')
+    interactive = not (batch or args.serve or args.socket)
+    profiler.mark("imports")
+    welcome = WelcomeReader()
+    if interactive:
+        welcome.start()
+    if args.profile is not None:
+        from app.util.profiling import set_slow_threshold
+        set_slow_threshold(args.profile)
+    if args.unique_phones:
+        constant.UNIQUE_PHONES = True
+    if args.trace_allocations:
+        import tracemalloc
+        tracemalloc.start()
+    with ExitStack() as stack:
+        if args.metrics_file:
+            from app.util.metrics import metrics
+            stack.callback(metrics.dump, args.metrics_file)
+        with profiler.phase("storage load"):
+            stack.enter_context(storage)
+        if interactive:
+            print_welcome(welcome)
+        if args.profile_startup:
+            profiler.uninstall()
+            print(profiler.report(), file=sys.stderr)
+
+        if args.serve or args.socket:
+            start_server(args.serve, args.socket, args.transfer_dir)
+        elif batch:
+            start_batch(batch, args.quiet)
+        else:
+            start_bot()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,18 @@
+import unittest
+from unittest import mock
+from app.command_handler import books_stamp
+from app.contacts import AddressBook
+from app.storage import DataStorage
+
+
+class BooksStampTest(unittest.TestCase):
+    def test_stamp_changes_when_the_book_is_loaded_again(self):
+        with mock.patch.object(DataStorage, 'contacts', new_callable=mock.PropertyMock) as contacts:
+            contacts.return_value = AddressBook()
+            stamp = books_stamp(('contacts',))
+            contacts.return_value = AddressBook()
+            self.assertNotEqual(books_stamp(('contacts',)), stamp)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from app import constant
+from app.contacts import AddressBook, Record
+from app.exceptions import NotFoundException
+from app.mapped_storage import MappedAddressBook, MappedSnapshot, dump
+from app.notes import NoteBook
+
+
+def build_book(*names: str) -> AddressBook:
+    book = AddressBook()
+    for name in names:
+        book.add_record(Record(name))
+    return book
+
+
+class LookupTest(unittest.TestCase):
+    def test_lookup_ignores_case_without_building_suggestions(self):
+        book = build_book('Alice', 'Bob')
+        self.assertEqual(book.lookup('alice').name.value, 'Alice')
+        with self.assertRaises(NotFoundException):
+            book.lookup('Carol')
+        self.assertNotIn('suggest', book._indexes)
+
+    def test_names_differing_in_case_only_are_suggested(self):
+        book = build_book('Alice', 'ALICE')
+        with self.assertRaisesRegex(NotFoundException, "'ALICE' or 'Alice'"):
+            book.find('alice')
+        self.assertEqual(book.find('ALICE').name.value, 'ALICE')
+
+    def test_mapped_book_resolves_names_from_the_snapshot(self):
+        path = os.path.join(tempfile.mkdtemp(), 'storage.map')
+        with open(path, 'wb') as fh:
+            dump(fh, build_book('Alice', 'bob', 'Bobby', 'Carol'), NoteBook())
+        snapshot = MappedSnapshot(path)
+        self.addCleanup(snapshot.close)
+        book = MappedAddressBook(snapshot)
+        book.delete('Carol')
+        book.add_record(Record('BOBO'))
+        self.assertEqual(book.lookup('ALICE').name.value, 'Alice')
+        self.assertEqual(book.complete_name('bo', 10), ['bob', 'Bobby', 'BOBO'])
+        with self.assertRaises(NotFoundException):
+            book.lookup('carol')
+
+
+class ValuesAfterTest(unittest.TestCase):
+    def test_listing_continues_after_the_key(self):
+        book = build_book('Alice', 'Bob', 'Carol')
+        self.assertEqual([record.name.value for record in book.values_after('Alice')], ['Bob', 'Carol'])
+        with self.assertRaises(NotFoundException):
+            book.values_after('Dave')
+
+    def test_listing_follows_the_book_order_after_changes(self):
+        book = build_book('Alice', 'Bob', 'Carol')
+        book.values_after('Alice')
+        book.delete('Bob')
+        book.add_record(Record('Bob'))
+        book.add_record(Record('Dave'))
+        self.assertEqual([record.name.value for record in book.values_after('Alice')], list(book.data)[1:])
+        self.assertEqual([record.name.value for record in book.values_after('Bob')], ['Dave'])
+
+    def test_mapped_listing_continues_after_the_key(self):
+        path = os.path.join(tempfile.mkdtemp(), 'storage.map')
+        with open(path, 'wb') as fh:
+            dump(fh, build_book('Alice', 'Bob', 'Carol'), NoteBook())
+        snapshot = MappedSnapshot(path)
+        self.addCleanup(snapshot.close)
+        book = MappedAddressBook(snapshot)
+        book.delete('Bob')
+        book.add_record(Record('Dave'))
+        book.add_record(Record('Eve'))
+        self.assertEqual([record.name.value for record in book.values_after('Alice')], ['Carol', 'Dave', 'Eve'])
+        self.assertEqual([record.name.value for record in book.values_after('Dave')], ['Eve'])
+        with self.assertRaises(NotFoundException):
+            book.values_after('Bob')
+
+
+def record_with_phones(name: str, *phones: str) -> Record:
+    record = Record(name)
+    for phone in phones:
+        record.add_phone(phone)
+    return record
+
+
+class MergeTest(unittest.TestCase):
+    @mock.patch.object(constant, 'UNIQUE_PHONES', True)
+    def test_records_with_phones_of_other_contacts_are_rejected(self):
+        book = AddressBook()
+        book.add_record(record_with_phones('Alice', '0991234567'))
+        added, merged, rejected = book.merge_records([
+            record_with_phones('Bob', '0991234567'),
+            record_with_phones('Carol', '0501234567'),
+            record_with_phones('Dave', '0501234567'),
+            record_with_phones('Alice', '0991234567', '0671234567'),
+        ])
+        self.assertEqual((added, merged), (1, 1))
+        self.assertEqual([index for index, _ in rejected], [0, 2])
+        self.assertEqual(book.phone_owners('0501234567'), ['Carol'])
+        self.assertEqual(book.phone_owners('0671234567'), ['Alice'])
+
+    def test_mapped_book_merges_a_name_repeated_in_the_batch(self):
+        path = os.path.join(tempfile.mkdtemp(), 'storage.map')
+        with open(path, 'wb') as fh:
+            dump(fh, AddressBook({'Alice': record_with_phones('Alice', '0990000000')}), NoteBook())
+        snapshot = MappedSnapshot(path)
+        self.addCleanup(snapshot.close)
+        book = MappedAddressBook(snapshot)
+        added, merged, _ = book.merge_records([
+            record_with_phones('Alice', '0991111111'),
+            record_with_phones('alice', '0992222222'),
+        ])
+        self.assertEqual((added, merged), (0, 2))
+        self.assertEqual([phone.value for phone in book.data['Alice'].phones],
+                         ['0990000000', '0991111111', '0992222222'])
+
+    def test_names_differing_in_case_only_are_merged(self):
+        book = build_book('Alice')
+        added, merged, rejected = book.merge_records([
+            record_with_phones('alice', '0991234567'),
+            record_with_phones('bob', '0501234567'),
+            record_with_phones('BOB', '0671234567'),
+        ])
+        self.assertEqual((added, merged, rejected), (1, 2, []))
+        self.assertEqual(sorted(book.data), ['Alice', 'bob'])
+        self.assertEqual(book.phone_owners('0991234567'), ['Alice'])
+        self.assertEqual(book.phone_owners('0671234567'), ['bob'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import os
+import tempfile
+import unittest
+from app.contacts import AddressBook
+from app.contacts_transfer import import_contacts
+
+LINES = [
+    '{"name": 5, "phones": ["0991112299"]}',
+    '{"name": "Alice", "phones": "0991112299"}',
+    '{"name": "Bob", "phones": [991112299]}',
+    '{"name": "Carol", "email": ["carol@mail.com"]}',
+    '[1, 2]',
+    '{"name": "Dave", "phones": ["0991112299"]}',
+]
+
+
+class ImportTest(unittest.TestCase):
+    def test_malformed_lines_are_reported(self):
+        path = os.path.join(tempfile.mkdtemp(), 'contacts.jsonl')
+        with open(path, 'w') as fh:
+            fh.write('\n'.join(LINES) + '\n')
+        book = AddressBook()
+        report = import_contacts(book, path, progress=None)
+        self.assertEqual(list(book.data), ['Dave'])
+        self.assertEqual(report.errors, 5)
+        self.assertEqual(report.reported_errors, [
+            ('line 1', "Contact name must be a string"),
+            ('line 2', "Phones must be a list of strings"),
+            ('line 3', "Phones must be a list of strings"),
+            ('line 4', "Contact email must be a string"),
+            ('line 5', "Contact must be a JSON object"),
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import cProfile
+import unittest
+from unittest import mock
+from app.command_handler import MeasuredResult
+from app.util import profiling
+from app.util.metrics import Metrics
+
+
+def chunks():
+    yield 'first'
+    yield 'second'
+    yield 'third'
+
+
+class CommandProfileTest(unittest.TestCase):
+    def test_lazy_result_runs_unprofiled_while_another_profiler_is_active(self):
+        command_profile = profiling.CommandProfile('all-notes', [])
+        registry = Metrics()
+        result = MeasuredResult(chunks(), registry.start('all-notes'), command_profile)
+        other = cProfile.Profile()
+        other.enable()
+        try:
+            # Python 3.12+ refuses a second active profiler with ValueError
+            with mock.patch.object(command_profile.profile, 'enable', side_effect=ValueError):
+                consumed = [next(result)]
+            consumed += list(result)
+        finally:
+            other.disable()
+        self.assertEqual(consumed, ['first', 'second', 'third'])
+        self.assertIsNone(command_profile.profile)
+        self.assertEqual(registry.snapshot()['all-notes']['errors'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
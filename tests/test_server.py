@@ -0,0 +1,48 @@
+import asyncio
+import contextlib
+import io
+import unittest
+from unittest import mock
+from app.server import BotServer, LINE_LIMIT
+
+
+class ServerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = await asyncio.start_server(BotServer().handle, '127.0.0.1', 0, limit=LINE_LIMIT)
+        port = self.server.sockets[0].getsockname()[1]
+        self.reader, self.writer = await asyncio.open_connection('127.0.0.1', port)
+        await self.response()
+
+    async def asyncTearDown(self):
+        self.writer.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def response(self) -> list[str]:
+        lines = []
+        while (line := (await self.reader.readline()).decode().rstrip('\n')) != '.':
+            lines.append(line)
+        return lines
+
+    async def send(self, line: bytes) -> list[str]:
+        self.writer.write(line + b'\n')
+        await self.writer.drain()
+        return await self.response()
+
+    async def test_blank_line_gets_an_error(self):
+        self.assertEqual(await self.send(b'  '), ['Invalid command.'])
+
+    async def test_failed_command_gets_an_error_and_keeps_the_connection(self):
+        with mock.patch('app.server.run_command', side_effect=RuntimeError("boom")), \
+                contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(await self.send(b'phone Alice'), ["Command failed: boom"])
+        self.assertEqual(await self.send(b''), ['Invalid command.'])
+
+    async def test_overlong_line_gets_an_error_and_closes_the_connection(self):
+        response = await self.send(b'x' * (LINE_LIMIT + 1))
+        self.assertEqual(response, [f"Commands longer than {LINE_LIMIT} bytes are not accepted."])
+        self.assertEqual(await self.reader.read(), b'')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import io
+import marshal
+import unittest
+from unittest import mock
+from app import snapshot
+from app.contacts import AddressBook, Record
+from app.notes import NoteBook
+
+
+class SnapshotTest(unittest.TestCase):
+    def dumped(self) -> io.BytesIO:
+        book = AddressBook()
+        book.add_record(Record('Alice'))
+        fh = io.BytesIO()
+        snapshot.dump(fh, book, NoteBook())
+        fh.seek(0)
+        return fh
+
+    def test_snapshot_is_loaded_back(self):
+        book, notes = snapshot.load(self.dumped())
+        self.assertEqual(list(book.data), ['Alice'])
+
+    def test_snapshot_of_newer_marshal_version_is_refused(self):
+        fh = self.dumped()
+        with mock.patch.object(marshal, 'version', marshal.version - 1):
+            with self.assertRaisesRegex(ValueError, 'marshal version'):
+                snapshot.load(fh)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import os
+import tempfile
+import unittest
+from app.contacts import AddressBook, Record
+from app.notes import NoteBook
+from app.storage import JournalEngine
+
+
+class JournalEngineTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.storage_path = os.path.join(directory, 'storage.bin')
+        self.journal_path = os.path.join(directory, 'storage.log')
+
+    def engine(self) -> JournalEngine:
+        return JournalEngine(self.storage_path, self.journal_path, compact_threshold=3)
+
+    def test_segment_left_by_interrupted_compaction_is_compacted(self):
+        engine = self.engine()
+        book, notes = engine.open(AddressBook(), NoteBook())
+        book.add_record(Record('Alice'))
+        # the process dies after the rotation, before the compaction ends
+        engine.journal.rotate()
+        engine.close(book, notes)
+
+        engine = self.engine()
+        book, notes = engine.open(*engine.load())
+        engine.compactor.join()
+        self.assertFalse(engine.journal.rotated_path.exists())
+        self.assertEqual(list(engine.load_snapshot()[0].data), ['Alice'])
+
+        for name in ('Bob', 'Carol', 'Dave'):
+            book.add_record(Record(name))
+        engine.close(book, notes)
+        self.assertFalse(engine.journal.rotated_path.exists())
+        self.assertEqual(list(engine.load_snapshot()[0].data), ['Alice', 'Bob', 'Carol', 'Dave'])
+
+
+if __name__ == '__main__':
+    unittest.main()